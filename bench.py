@@ -0,0 +1,184 @@
+import argparse
+import dataclasses
+import json
+import platform
+import sys
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt
+
+from headless import create_simulation, HEADLESS_BACKENDS, HEADLESS_DEFAULT_SIM_DT
+from simulation import SIMULATION_DEFAULT_CONFIG, Timer
+from vecmath import Vec2
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is reported as None there
+    resource = None
+
+
+BENCH_DEFAULT_SIZES = (100, 1000, 10000, 100000)  # victims, predators and food keep the default proportions
+BENCH_DEFAULT_STEPS = 200
+BENCH_DEFAULT_MAX_SECONDS = 30  # per size, the timed loop stops early once it is over this budget
+BENCH_WARMUP_STEPS = 5
+BENCH_PROFILE_STEPS = 20
+BENCH_DEFAULT_TOLERANCE = 0.1  # relative change flagged as a regression
+BENCH_MICRO_NUMBER = 200000
+
+
+def scaled_config(victims, base=SIMULATION_DEFAULT_CONFIG):
+    # the world grows with the population so that density, and so the work per agent, stays the same
+    factor = victims / base.victims_init_number
+    width, height = base.world_size
+    return dataclasses.replace(base,
+                               world_size=(round(width * sqrt(factor)), round(height * sqrt(factor))),
+                               victims_init_number=victims,
+                               predators_init_number=round(base.predators_init_number * factor),
+                               victim_foods_init_number=round(base.victim_foods_init_number * factor))
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def bench_size(size, backend, seed, steps, sim_dt, max_seconds):
+    config = scaled_config(size)
+    start = time.perf_counter()
+    simulation = create_simulation(backend, seed, config)
+    simulation.setup()
+    setup_seconds = time.perf_counter() - start
+
+    for i in range(BENCH_WARMUP_STEPS):
+        simulation.step(sim_dt)
+
+    done = 0
+    start = time.perf_counter()
+    while done < steps:
+        simulation.step(sim_dt)
+        done += 1
+        if time.perf_counter() - start > max_seconds:
+            break
+    elapsed = time.perf_counter() - start
+
+    profiler = simulation.get_profiler()
+    profiler.set_enabled(True, count_ops=False)
+    for i in range(min(BENCH_PROFILE_STEPS, done)):
+        simulation.step(sim_dt)
+    profiler.set_enabled(False)
+    simulation.clear()
+
+    return {
+        'size': size,
+        'backend': backend,
+        'agents': config.victims_init_number + config.predators_init_number + config.victim_foods_init_number,
+        'setup_s': setup_seconds,
+        'steps': done,
+        'steps_per_sec': done / elapsed,
+        'step_ms': elapsed / done * 1e3,
+        'peak_rss_mb': peak_rss_mb(),
+        'phases_ms': profiler.get_means_ms(),
+        'victims_end': simulation.get_victims_number(),
+        'predators_end': simulation.get_predators_number(),
+    }
+
+
+def _micro(stmt, setup_globals, number):
+    return min(timeit.repeat(stmt, globals=setup_globals, number=number, repeat=3)) / number * 1e9
+
+
+def micro_benchmarks(number=BENCH_MICRO_NUMBER):  # nanoseconds per call
+    a, b = Vec2(3.0, 4.0), Vec2(1.5, -2.0)
+    timer = Timer(1e18)
+    names = {'a': a, 'b': b, 'timer': timer, 'Vec2': Vec2}
+    return {
+        'vec2_new': _micro('Vec2(1.0, 2.0)', names, number),
+        'vec2_add': _micro('a + b', names, number),
+        'vec2_sub': _micro('a - b', names, number),
+        'vec2_mul': _micro('a * 0.5', names, number),
+        'vec2_length': _micro('a.length()', names, number),
+        'vec2_normalize': _micro('a.normalize()', names, number),
+        'vec2_sub_length': _micro('(a - b).length()', names, number),
+        'timer_update': _micro('timer.update(16.0)', names, number),
+    }
+
+
+def run_benchmarks(sizes, backend='objects', seed=0, steps=BENCH_DEFAULT_STEPS, sim_dt=HEADLESS_DEFAULT_SIM_DT,
+                   max_seconds=BENCH_DEFAULT_MAX_SECONDS, micro=True):
+    scaling = list()
+    for size in sizes:
+        # a fresh process per size, so that peak RSS belongs to that size alone
+        with ProcessPoolExecutor(1) as executor:
+            result = executor.submit(bench_size, size, backend, seed, steps, sim_dt, max_seconds).result()
+        scaling.append(result)
+        print(f'{backend} {size:>7}: {result["steps_per_sec"]:9.2f} steps/s, {result["step_ms"]:9.3f} ms/step, '
+              f'peak RSS {result["peak_rss_mb"]} MiB')
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'sim_dt': sim_dt,
+        'scaling': scaling,
+        'micro_ns': micro_benchmarks() if micro else dict(),
+    }
+
+
+def compare(results, baseline, tolerance=BENCH_DEFAULT_TOLERANCE):  # returns a list of regression messages
+    regressions = list()
+    old_runs = {(run['backend'], run['size']): run for run in baseline.get('scaling', ())}
+    for run in results['scaling']:
+        old = old_runs.get((run['backend'], run['size']))
+        if old is None:
+            continue
+        name = f'{run["backend"]} {run["size"]}'
+        if run['steps_per_sec'] < old['steps_per_sec'] * (1 - tolerance):
+            regressions.append(f'{name}: steps/sec {old["steps_per_sec"]:.2f} -> {run["steps_per_sec"]:.2f}')
+        if run['peak_rss_mb'] and old['peak_rss_mb'] and run['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f'{name}: peak RSS {old["peak_rss_mb"]:.1f} -> {run["peak_rss_mb"]:.1f} MiB')
+    old_micro = baseline.get('micro_ns', dict())
+    for name, ns in results['micro_ns'].items():
+        if name in old_micro and ns > old_micro[name] * (1 + tolerance):
+            regressions.append(f'{name}: {old_micro[name]:.1f} -> {ns:.1f} ns')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure simulation throughput for growing populations.')
+    parser.add_argument('--sizes', type=lambda text: [int(x) for x in text.split(',')],
+                        default=list(BENCH_DEFAULT_SIZES), metavar='N1,N2,...', help='initial victim numbers')
+    parser.add_argument('--backend', choices=HEADLESS_BACKENDS, default='objects')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-n', '--steps', type=int, default=BENCH_DEFAULT_STEPS, help='timed steps per size')
+    parser.add_argument('--sim-dt', type=float, default=HEADLESS_DEFAULT_SIM_DT,
+                        help='simulation milliseconds per step')
+    parser.add_argument('--max-seconds', type=float, default=BENCH_DEFAULT_MAX_SECONDS,
+                        help='wall time budget of the timed loop per size')
+    parser.add_argument('--no-micro', action='store_true', help='skip the Vec2 and Timer micro-benchmarks')
+    parser.add_argument('-o', '--output', default='bench.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='flag regressions against an earlier output')
+    parser.add_argument('--tolerance', type=float, default=BENCH_DEFAULT_TOLERANCE,
+                        help='relative slowdown or memory growth counted as a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.backend, args.seed, args.steps, args.sim_dt, args.max_seconds,
+                             not args.no_micro)
+    for name, ns in results['micro_ns'].items():
+        print(f'{name:>16}: {ns:8.1f} ns')
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against', args.compare)
+
+
+if __name__ == '__main__':
+    main()
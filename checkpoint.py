@@ -0,0 +1,35 @@
+import json
+import numpy as np
+
+
+CHECKPOINT_VERSION = 6  # 2 food mass and availability, 3 corpses, 4 wander streams, 5 corpses and caches by species,
+# 6 no rotten timers on victims
+
+
+# A checkpoint is an uncompressed .npz archive: one array per agent field, named
+# '<kind>.<field>', plus a 'meta' JSON string with the clock, counters, config and RNG state
+def write_checkpoint(path, backend, meta, columns):
+    meta = dict(meta, version=CHECKPOINT_VERSION, backend=backend)
+    with open(path, 'wb') as f:  # np.savez would append '.npz' to a path without it
+        np.savez(f, meta=np.array(json.dumps(meta)), **columns)
+
+
+def read_checkpoint(path, backend):
+    with np.load(path) as data:
+        meta = json.loads(data['meta'].item())
+        columns = {name: data[name] for name in data.files if name != 'meta'}
+    if meta.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'Unsupported checkpoint version: {meta.get("version")}')
+    if meta.get('backend') != backend:
+        raise ValueError(f'Checkpoint was written by the {meta.get("backend")} backend, not {backend}')
+    return meta, columns
+
+
+def records_to_columns(kind, records, fields):  # fields maps names to (dtype, shape of one item)
+    return {f'{kind}.{name}': np.array([record[name] for record in records], dtype).reshape((-1, *shape))
+            for name, (dtype, shape) in fields.items()}
+
+
+def columns_to_records(kind, columns, fields):
+    values = [columns[f'{kind}.{name}'].tolist() for name in fields]
+    return [dict(zip(fields, record)) for record in zip(*values)]
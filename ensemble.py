@@ -0,0 +1,142 @@
+import argparse
+import time
+
+import numpy as np
+
+from headless import HEADLESS_DEFAULT_SIM_DT
+from simulation import PREDATOR_STATE_NAMES, SIMULATION_DEFAULT_CONFIG, SIMULATION_METER, VICTIM_STATE_NAMES
+from sweep import write_table
+from vectorized import AgentArrays, VectorSimulation, agent_fields
+
+
+ENSEMBLE_DEFAULT_REPLICAS = 100
+ENSEMBLE_DEFAULT_STEPS = 10000
+ENSEMBLE_DEFAULT_SAMPLE_EVERY = 100  # steps
+ENSEMBLE_TILE_MARGIN = SIMULATION_METER  # added to the largest interaction radius between two tiles
+
+ENSEMBLE_SERIES_COLUMNS = ('step', 'time', 'replica', *(f'victims_{name}' for name in VICTIM_STATE_NAMES),
+                           *(f'predators_{name}' for name in PREDATOR_STATE_NAMES),
+                           'victims_died', 'predators_died', 'victim_foods_available')
+
+
+class ReplicaAgentArrays(AgentArrays):  # also counts the agents compacted away, per replica
+
+    def __init__(self, fields, replica_of, replicas):
+        super().__init__(fields)
+        self._replica_of = replica_of  # positions -> replica indices
+        self._removed = np.zeros(replicas, dtype=np.int64)
+
+    def get_removed(self):
+        return self._removed
+
+    def compact(self, keep):
+        self._removed += np.bincount(self._replica_of(self['position'][~keep]), minlength=len(self._removed))
+        super().compact(keep)
+
+
+# R independent worlds of the same config advanced together by one VectorSimulation. The worlds
+# are laid out side by side along x as tiles of one wide world, each tile further from the next
+# than any interaction radius, so the neighbour queries never pair agents of different replicas
+# and no replica index has to be stored: it follows from the x coordinate. Wander targets are
+# clamped to the agent's own tile. All replicas share one random stream, so a replica does not
+# reproduce a single VectorSimulation run with some seed, but the ensemble is reproducible as a whole
+class EnsembleSimulation(VectorSimulation):
+
+    def __init__(self, replicas, seed=None, fixed_sim_dt=None, config=SIMULATION_DEFAULT_CONFIG):
+        super().__init__(seed, fixed_sim_dt, config)
+        self._replicas = replicas
+        self._tile_size = np.array(config.world_size, dtype=np.float64)
+        reach = max(max(species.view_radius, species.scary_radius) for species in self._species.values())
+        self._stride = self._tile_size[0] + reach + ENSEMBLE_TILE_MARGIN  # from one tile origin to the next
+        self._world_size = np.array((self._stride * (replicas - 1) + self._tile_size[0], self._tile_size[1]))
+        self._agents = {name: ReplicaAgentArrays(agent_fields(species), self.get_replicas_of, replicas)
+                        for name, species in self._species.items()}
+
+    def get_replicas(self):
+        return self._replicas
+
+    def get_replicas_of(self, positions):
+        return np.minimum((positions[:, 0] // self._stride).astype(np.int64), self._replicas - 1)
+
+    def _random_positions(self, number):  # spread evenly over the replicas
+        positions = self._rng.integers(0, self._tile_size + 1, size=(number, 2)).astype(np.float64)
+        positions[:, 0] += np.arange(number) % self._replicas * self._stride
+        return positions
+
+    def setup(self):
+        replicas = self._replicas
+        for name, species in self._species.items():
+            number = species.init_number * replicas
+            self.add_agents(name, self._random_positions(number), self._rng.uniform(0, 400, number))
+        self.add_victim_foods(self._random_positions(self._config.victim_foods_init_number * replicas))
+
+    def _world_bounds(self, positions):
+        low = np.zeros((len(positions), 2))
+        low[:, 0] = self.get_replicas_of(positions) * self._stride
+        return low, low + self._tile_size
+
+    def _count_by_replica(self, agents, states):  # replicas x states
+        keys = self.get_replicas_of(agents['position']) * states + agents['state']
+        return np.bincount(keys, minlength=self._replicas * states).reshape(self._replicas, states)
+
+    # Per replica: the numbers of victims and predators in every state, as replicas x states
+    # matrices, the agents that died (rotten bodies for victims) and the available food patches
+    def sample(self):
+        victims, predators = self._agents['victim'], self._agents['predator']
+        return {'victims': self._count_by_replica(victims, len(VICTIM_STATE_NAMES)),
+                'predators': self._count_by_replica(predators, len(PREDATOR_STATE_NAMES)),
+                'victims_died': victims.get_removed().copy(),
+                'predators_died': predators.get_removed().copy(),
+                'victim_foods_available': np.bincount(self.get_replicas_of(self._victim_foods[self._available_foods]),
+                                                      minlength=self._replicas)}
+
+    # The checkpoints of the numpy backend hold one world, saving the replicas as one would mix them
+    def save(self, path):
+        raise TypeError('An ensemble cannot be saved, checkpoints hold a single world')
+
+    @classmethod
+    def load(cls, path):
+        raise TypeError('An ensemble cannot be loaded, checkpoints hold a single world')
+
+
+def sample_rows(simulation, step):
+    sample = simulation.sample()
+    return [(step, simulation.get_time(), replica, *sample['victims'][replica].tolist(),
+             *sample['predators'][replica].tolist(), int(sample['victims_died'][replica]),
+             int(sample['predators_died'][replica]), int(sample['victim_foods_available'][replica]))
+            for replica in range(simulation.get_replicas())]
+
+
+def run(replicas, steps, sim_dt, seed=None, config=SIMULATION_DEFAULT_CONFIG,
+        sample_every=ENSEMBLE_DEFAULT_SAMPLE_EVERY):
+    simulation = EnsembleSimulation(replicas, seed, config=config)
+    simulation.setup()
+    rows = sample_rows(simulation, 0)
+    start = time.perf_counter()
+    for step in range(1, steps + 1):
+        simulation.step(sim_dt)
+        if step % sample_every == 0 or step == steps:
+            rows.extend(sample_rows(simulation, step))
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many replicas of one config in a single vectorized simulation.')
+    parser.add_argument('-r', '--replicas', type=int, default=ENSEMBLE_DEFAULT_REPLICAS)
+    parser.add_argument('-n', '--steps', type=int, default=ENSEMBLE_DEFAULT_STEPS)
+    parser.add_argument('--sim-dt', type=float, default=HEADLESS_DEFAULT_SIM_DT,
+                        help='simulation milliseconds per step')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--sample-every', type=int, default=ENSEMBLE_DEFAULT_SAMPLE_EVERY, help='steps between samples')
+    parser.add_argument('-o', '--output', default='ensemble.csv')
+    args = parser.parse_args()
+    if args.replicas < 1:
+        parser.error('--replicas must be at least 1')
+
+    rows, elapsed = run(args.replicas, args.steps, args.sim_dt, args.seed, sample_every=args.sample_every)
+    write_table(args.output, ENSEMBLE_SERIES_COLUMNS, rows)
+    print(f'{args.replicas} replicas, {args.steps} steps in {elapsed:.1f} s, {len(rows)} rows written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
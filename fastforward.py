@@ -0,0 +1,283 @@
+import argparse
+import dataclasses
+import functools
+import random
+import time
+
+from headless import create_simulation, HEADLESS_DEFAULT_SIM_DT, HEADLESS_DEFAULT_STEPS
+from simulation import AGENT_FIND_PARTNER_STATE, SIMULATION_DEFAULT_CONFIG, SIMULATION_SECOND, VICTIM_SCARY_STATE
+from sweep import write_table
+from telemetry import TELEMETRY_DEFAULT_PERIOD
+
+
+FAST_FORWARD_DEFAULT_TOLERANCE = 0.1  # largest divergence of the pilots, relative to the fixed-step run
+FAST_FORWARD_DEFAULT_PILOT_STEPS = 1000  # fixed steps the exposure is calibrated on
+FAST_FORWARD_DEFAULT_MAX_GROWTH = 16  # longest step taken, in fixed steps
+FAST_FORWARD_STEP_GROWTH = 2  # from the exposure of one pilot to the next
+FAST_FORWARD_SERIES_COLUMNS = ('time', 'victims', 'predators')
+FAST_FORWARD_KINDS = ('victims', 'predators')
+FAST_FORWARD_MEAL_EVENTS = ('victim_eats', 'predator_eats')  # by kind, one per agent and tick spent eating
+
+
+def _sample(simulation):
+    return simulation.get_time(), simulation.get_victims_number(), simulation.get_predators_number()
+
+
+# Agents whose outcome depends on when they meet another: victims with a predator within their
+# scary radius, which both backends find with a grid query on every tick, agents of either kind
+# looking for a partner, and the predators that fed in the last step, given as hunting. All come
+# from counters the simulation keeps, so the measure costs nothing
+def get_encounters(simulation, hunting):
+    victims, predators = simulation.get_victim_state_counts(), simulation.get_predator_state_counts()
+    return (victims[VICTIM_SCARY_STATE] + victims[AGENT_FIND_PARTNER_STATE] + predators[AGENT_FIND_PARTNER_STATE]
+            + hunting)
+
+
+class FixedStep:
+
+    def __init__(self, sim_dt):
+        self._sim_dt = sim_dt
+
+    def get_exposure(self):  # the step does not follow the encounters
+        return None
+
+    def get_shortest(self):
+        return self._sim_dt
+
+    def get_step(self, encounters):
+        return self._sim_dt
+
+
+# A step chosen before every tick from the encounters going on: exposure / encounters, so that the
+# step times the encounters stays within the exposure, between min_dt and max_dt. Phases with no
+# encounter at all take the longest step
+class EncounterStep:
+
+    def __init__(self, min_dt, max_dt, exposure):
+        self._min_dt = min_dt
+        self._max_dt = max_dt
+        self._exposure = exposure
+
+    def get_exposure(self):
+        return self._exposure
+
+    def get_shortest(self):
+        return self._min_dt
+
+    def get_step(self, encounters):
+        if encounters == 0:
+            return self._max_dt
+        return min(self._max_dt, max(self._min_dt, self._exposure / encounters))
+
+
+# A simulation with the series of its populations, sampled at the first step at or after every
+# multiple of period, the sim time each kind spent eating, the mean encounters over sim time, and
+# the steps and wall time it took. Meal events count ticks, the time spent eating is the same
+# whatever the step length
+class SampledRun:
+
+    def __init__(self, simulation, period):
+        self._simulation = simulation
+        self._period = period
+        self._series = [_sample(simulation)]
+        self._next_sample = simulation.get_time() + period
+        self._meals = [simulation.get_event_counts()[event] for event in FAST_FORWARD_MEAL_EVENTS]
+        self._eating = [0.0] * len(FAST_FORWARD_MEAL_EVENTS)
+        self._encounter_time = 0.0  # encounters times the step they lasted, summed over the steps
+        self._hunting = 0  # predators that fed in the last step
+        self._start_time = simulation.get_time()
+        self._steps = 0
+        self._elapsed = 0.0
+
+    def get_simulation(self):
+        return self._simulation
+
+    def get_series(self):
+        return self._series
+
+    def get_eating(self):  # sim milliseconds spent eating by kind, summed over the agents
+        return self._eating
+
+    def get_mean_encounters(self):
+        duration = self._simulation.get_time() - self._start_time
+        return self._encounter_time / duration if duration else 0.0
+
+    def get_steps(self):
+        return self._steps
+
+    def get_elapsed(self):
+        return self._elapsed
+
+    def advance(self, end, steps):  # up to the simulation time end in steps of a FixedStep or EncounterStep
+        simulation = self._simulation
+        start = time.perf_counter()
+        while end - simulation.get_time() > 1e-6 * steps.get_shortest():
+            encounters = get_encounters(simulation, self._hunting)
+            step = min(steps.get_step(encounters), end - simulation.get_time())
+            self._encounter_time += encounters * step
+            simulation.step(step)
+            self._steps += 1
+            events = simulation.get_event_counts()
+            self._hunting = events['predator_eats'] - self._meals[FAST_FORWARD_MEAL_EVENTS.index('predator_eats')]
+            for kind, event in enumerate(FAST_FORWARD_MEAL_EVENTS):
+                self._eating[kind] += (events[event] - self._meals[kind]) * step
+                self._meals[kind] = events[event]
+            if simulation.get_time() >= self._next_sample:
+                self._series.append(_sample(simulation))
+                while self._next_sample <= simulation.get_time():
+                    self._next_sample += self._period
+        self._elapsed += time.perf_counter() - start
+
+
+# Per population: the largest and the mean absolute difference between two series sampled at the
+# same periods, and the mean one relative to the mean of the reference
+def divergence(series, reference):
+    report = dict()
+    for column, kind in enumerate(FAST_FORWARD_KINDS, 1):
+        pairs = list(zip((sample[column] for sample in series), (sample[column] for sample in reference)))
+        differences = [abs(value - expected) for value, expected in pairs]
+        mean = sum(expected for value, expected in pairs) / len(pairs)
+        report[kind] = {'max': max(differences), 'mean': sum(differences) / len(differences),
+                        'relative': sum(differences) / len(differences) / mean if mean else 0.0}
+    return report
+
+
+# The larger relative divergence of a pilot from the fixed-step one, over both population curves and
+# the time each kind spent eating. Steps that change how often agents meet show in the meals well
+# before they show in the populations
+def get_pilot_divergence(run, reference):
+    worst = max(stats['relative'] for stats in divergence(run.get_series(), reference.get_series()).values())
+    for eating, expected in zip(run.get_eating(), reference.get_eating()):
+        if expected:
+            worst = max(worst, abs(eating - expected) / expected)
+    return worst
+
+
+# The exposure of the EncounterStep is bounded by measured divergence: pilot runs of the same seed
+# cover the first end sim milliseconds, one in fixed steps of min_dt and the others with exposures
+# growing by FAST_FORWARD_STEP_GROWTH, starting from the one that gives twice min_dt at the mean
+# encounters of the fixed pilot, as long as that step is at most max_dt. The pilot with the largest
+# exposure that stays within tolerance of the fixed one is returned to go on as the fast-forward
+# run, with its steps and (exposure, run, divergence) of every pilot, an exposure of None for the
+# fixed one. All of them are tried, as two runs of one seed drift apart by chance too, and one pilot
+# over the tolerance does not mean that all larger exposures are
+def calibrate(make_simulation, end, period, min_dt, max_dt, tolerance=FAST_FORWARD_DEFAULT_TOLERANCE):
+    reference = SampledRun(make_simulation(), period)
+    steps = FixedStep(min_dt)
+    reference.advance(end, steps)
+    chosen = reference
+    pilots = [(None, reference, 0.0)]
+    encounters = max(reference.get_mean_encounters(), 1.0)
+    candidate_dt = min_dt * FAST_FORWARD_STEP_GROWTH
+    while candidate_dt <= max_dt * (1 + 1e-9):
+        candidate = EncounterStep(min_dt, max_dt, candidate_dt * encounters)
+        run = SampledRun(make_simulation(), period)
+        run.advance(end, candidate)
+        worst = get_pilot_divergence(run, reference)
+        pilots.append((candidate.get_exposure(), run, worst))
+        if worst <= tolerance:
+            chosen, steps = run, candidate
+        candidate_dt *= FAST_FORWARD_STEP_GROWTH
+    return chosen, steps, pilots
+
+
+def _make_simulation(backend, seed, config):
+    simulation = create_simulation(backend, seed, config)
+    simulation.setup()
+    return simulation
+
+
+# The fast-forward run, calibrated on the first pilot_steps fixed steps and timed with its pilots,
+# against a fixed-step run of the same seed over the same simulated time. Only the pilots and the
+# fast-forward run close in on targets over long steps, the fixed-step runs keep the plain model
+def compare(duration, sim_dt, max_dt, tolerance=FAST_FORWARD_DEFAULT_TOLERANCE, backend='objects', seed=0,
+            config=SIMULATION_DEFAULT_CONFIG, period=TELEMETRY_DEFAULT_PERIOD, noise_floor=False,
+            pilot_steps=FAST_FORWARD_DEFAULT_PILOT_STEPS):
+    runs = dict()
+    make_simulation = functools.partial(_make_simulation, backend, seed,
+                                        dataclasses.replace(config, fast_forward_contact=True))
+    fast, steps, pilots = calibrate(make_simulation, min(pilot_steps * sim_dt, duration), period, sim_dt, max_dt,
+                                    tolerance)
+    # before the chosen pilot goes on
+    report = [(exposure, run.get_steps(), run.get_mean_encounters(), worst) for exposure, run, worst in pilots]
+    fast.advance(duration, steps)
+    runs['fast_forward'] = {'series': fast.get_series(), 'exposure': steps.get_exposure(),
+                            'mean_sim_dt': duration / fast.get_steps(), 'steps': 0, 'elapsed': 0.0,
+                            'pilots': report}
+    for exposure, run, worst in pilots:  # the pilots count towards the fast-forward run
+        runs['fast_forward']['steps'] += run.get_steps()
+        runs['fast_forward']['elapsed'] += run.get_elapsed()
+        run.get_simulation().clear()
+    for name, run_seed in (('fixed', seed), *((('other_seed', seed + 1),) if noise_floor else ())):
+        run = SampledRun(_make_simulation(backend, run_seed, config), period)
+        run.advance(duration, FixedStep(sim_dt))
+        run.get_simulation().clear()
+        runs[name] = {'series': run.get_series(), 'steps': run.get_steps(), 'elapsed': run.get_elapsed()}
+    runs['fast_forward']['divergence'] = divergence(runs['fast_forward']['series'], runs['fixed']['series'])
+    if noise_floor:  # how far the curves of the fixed-step model itself drift apart between seeds
+        runs['other_seed']['divergence'] = divergence(runs['other_seed']['series'], runs['fixed']['series'])
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the simulation with steps that shrink with the predator-victim '
+                                                 'encounters going on, as long as possible while its population '
+                                                 'curves stay within a tolerance of the fixed-step ones, and compare '
+                                                 'it with the fixed-step run over the same simulated time.')
+    parser.add_argument('-n', '--steps', type=int, default=HEADLESS_DEFAULT_STEPS,
+                        help='length of the fixed-step run, which the fast-forward run covers too')
+    parser.add_argument('--sim-dt', type=float, default=HEADLESS_DEFAULT_SIM_DT,
+                        help='simulation milliseconds per fixed step, the shortest step tried')
+    parser.add_argument('--max-dt', type=float, default=None,
+                        help='longest step in simulation milliseconds, taken when no encounter goes on, '
+                             f'by default {FAST_FORWARD_DEFAULT_MAX_GROWTH} fixed steps')
+    parser.add_argument('--tolerance', type=float, default=FAST_FORWARD_DEFAULT_TOLERANCE,
+                        help='largest divergence of a pilot from the fixed-step one: of the mean of either '
+                             'population curve and of the time either kind spent eating, as a share of the '
+                             'fixed-step value')
+    parser.add_argument('--pilot-steps', type=int, default=FAST_FORWARD_DEFAULT_PILOT_STEPS, metavar='N',
+                        help='fixed steps the exposure is calibrated on, the pilots count towards the wall '
+                             'time of the fast-forward run')
+    parser.add_argument('--seed', type=int, default=None, help='shared by all runs, drawn at random if not given')
+    parser.add_argument('--backend', choices=('objects', 'numpy'), default='objects')
+    parser.add_argument('--sample-period', type=float, default=TELEMETRY_DEFAULT_PERIOD / SIMULATION_SECOND,
+                        metavar='SECONDS', help='simulation seconds between population samples')
+    parser.add_argument('--noise-floor', action='store_true',
+                        help='also compare a fixed-step run with the next seed, for scale')
+    parser.add_argument('--series', metavar='CSV', help='write the population curves of all runs to this file')
+    args = parser.parse_args()
+    if args.tolerance <= 0:
+        parser.error('--tolerance must be positive')
+    if args.pilot_steps < 1:
+        parser.error('--pilot-steps must be at least 1')
+    if args.max_dt is not None and args.max_dt < args.sim_dt:
+        parser.error('--max-dt must not be shorter than --sim-dt')
+    max_dt = args.max_dt if args.max_dt is not None else FAST_FORWARD_DEFAULT_MAX_GROWTH * args.sim_dt
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    runs = compare(args.steps * args.sim_dt, args.sim_dt, max_dt, args.tolerance, args.backend, seed,
+                   SIMULATION_DEFAULT_CONFIG, args.sample_period * SIMULATION_SECOND, args.noise_floor,
+                   args.pilot_steps)
+    if args.series:
+        write_table(args.series, ('run', *FAST_FORWARD_SERIES_COLUMNS),
+                    [(name, *sample) for name, run in runs.items() for sample in run['series']])
+
+    fixed, fast = runs['fixed'], runs['fast_forward']
+    print(f'Seed: {seed}, simulated time: {args.steps * args.sim_dt / SIMULATION_SECOND} s')
+    print(f'Fixed step: {fixed["steps"]} steps, wall time {fixed["elapsed"]:.3f} s')
+    for exposure, steps, encounters, worst in fast['pilots']:
+        print(f'Pilot: {"fixed step" if exposure is None else f"exposure {exposure:.0f} ms"}, {steps} steps, '
+              f'{encounters:.1f} encounters on average, divergence {worst:.1%}')
+    exposure = 'fixed step' if fast['exposure'] is None else f'exposure {fast["exposure"]:.0f} ms'
+    print(f'Fast forward: {exposure}, mean step {fast["mean_sim_dt"]:.1f} ms, {fast["steps"]} steps with the '
+          f'pilots, wall time {fast["elapsed"]:.3f} s')
+    print(f'Speedup: {fixed["elapsed"] / fast["elapsed"]:.2f}x')
+    for name in ('fast_forward', 'other_seed'):
+        for column, (kind, stats) in enumerate(runs.get(name, dict()).get('divergence', dict()).items(), 1):
+            print(f'Divergence {name} {kind}: max {stats["max"]}, mean {stats["mean"]:.1f} '
+                  f'({stats["relative"]:.1%} of the fixed-step mean), '
+                  f'final {runs[name]["series"][-1][column]} vs {fixed["series"][-1][column]}')
+
+
+if __name__ == '__main__':
+    main()
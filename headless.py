@@ -0,0 +1,127 @@
+import argparse
+import dataclasses
+import time
+
+from metrics import MetricsServer, METRICS_DEFAULT_PERIOD, parse_address
+from simulation import Simulation, SIMULATION_DEFAULT_CONFIG, SIMULATION_SECOND, SIMULATION_TIME_FACTOR
+from telemetry import Telemetry, TELEMETRY_DEFAULT_PERIOD
+from trajectory import TrajectoryRecorder
+
+
+HEADLESS_DEFAULT_STEPS = 10000
+HEADLESS_DEFAULT_SIM_DT = SIMULATION_TIME_FACTOR * SIMULATION_SECOND / 60  # one 60 FPS frame
+
+
+HEADLESS_BACKENDS = ('objects', 'numpy')
+
+
+def create_simulation(backend, seed=None, config=SIMULATION_DEFAULT_CONFIG, two_phase=False, scheduled=False):
+    if backend == 'numpy':
+        from vectorized import VectorSimulation  # numpy is only needed for this backend
+        return VectorSimulation(seed, config=config)
+    return Simulation(seed, config=config, two_phase=two_phase, scheduled=scheduled)
+
+
+def load_simulation(backend, path):
+    if backend == 'numpy':
+        from vectorized import VectorSimulation
+        return VectorSimulation.load(path)
+    return Simulation.load(path)
+
+
+def run(steps, sim_dt, backend='objects', seed=None, config=SIMULATION_DEFAULT_CONFIG, checkpoint=None,
+        telemetry=None, profile=False, two_phase=False, scheduled=False, recorder=None, metrics=None,
+        count_ops=True):
+    if checkpoint is None:
+        simulation = create_simulation(backend, seed, config, two_phase, scheduled)
+        simulation.setup()
+    else:
+        simulation = load_simulation(backend, checkpoint)
+    if telemetry is not None:
+        telemetry.attach(simulation)
+    if recorder is not None:
+        recorder.attach(simulation)
+    if metrics is not None:
+        metrics.attach(simulation)
+    simulation.get_profiler().set_enabled(profile, count_ops)
+    start = time.perf_counter()
+    for i in range(steps):
+        simulation.step(sim_dt)
+    elapsed = time.perf_counter() - start
+    return simulation, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the population simulation without a display.')
+    parser.add_argument('-n', '--steps', type=int, default=HEADLESS_DEFAULT_STEPS)
+    parser.add_argument('--sim-dt', type=float, default=HEADLESS_DEFAULT_SIM_DT,
+                        help='simulation milliseconds per step')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--backend', choices=HEADLESS_BACKENDS, default='numpy')
+    parser.add_argument('--target-cache', type=int, default=0, metavar='TICKS',
+                        help='objects backend: reuse found targets for up to TICKS ticks')
+    parser.add_argument('--two-phase', action='store_true',
+                        help='objects backend: decide against the previous tick, then apply all changes at once')
+    parser.add_argument('--scheduled', action='store_true',
+                        help='objects backend: advance hunger and timers only when a state change is due')
+    parser.add_argument('--load', metavar='PATH', help='start from a checkpoint instead of a new world')
+    parser.add_argument('--save', metavar='PATH', help='write a checkpoint after the last step')
+    parser.add_argument('--telemetry', metavar='CSV', help='stream population records to this file')
+    parser.add_argument('--record', metavar='PATH', help='objects backend: record every tick to a trajectory file')
+    parser.add_argument('--profile', metavar='JSON', help='time the simulation phases and write a report')
+    parser.add_argument('--metrics', metavar='ADDRESS',
+                        help='serve live metrics over HTTP on HOST:PORT, :PORT for localhost, or a Unix socket path')
+    parser.add_argument('--metrics-period', type=float, default=METRICS_DEFAULT_PERIOD, metavar='SECONDS',
+                        help='wall clock seconds between metrics samples')
+    parser.add_argument('--metrics-run', metavar='LABEL', help='run label on every metric, to compare concurrent runs')
+    parser.add_argument('--metrics-phases', action='store_true',
+                        help='time the simulation phases for the metrics, without the Vec2 operation counts of '
+                             '--profile that slow the run down')
+    parser.add_argument('--telemetry-period', type=float, default=TELEMETRY_DEFAULT_PERIOD / SIMULATION_SECOND,
+                        metavar='SECONDS', help='simulation seconds between telemetry records')
+    args = parser.parse_args()
+    if args.two_phase and args.backend != 'objects':
+        parser.error('--two-phase applies to the objects backend, the numpy backend always updates in phases')
+    if args.scheduled and args.backend != 'objects':
+        parser.error('--scheduled applies to the objects backend')
+    if args.record and args.backend != 'objects':
+        parser.error('--record applies to the objects backend')
+
+    telemetry = None
+    if args.telemetry:
+        telemetry = Telemetry(args.telemetry, args.telemetry_period * SIMULATION_SECOND)
+    recorder = TrajectoryRecorder(args.record) if args.record else None
+    metrics = None
+    if args.metrics:
+        metrics = MetricsServer(parse_address(args.metrics), args.metrics_period, args.metrics_run)
+        print(f'Serving metrics on {metrics.get_address()}')
+    config = dataclasses.replace(SIMULATION_DEFAULT_CONFIG, target_cache_interval=args.target_cache)
+    simulation, elapsed = run(args.steps, args.sim_dt, args.backend, args.seed, config, checkpoint=args.load,
+                              telemetry=telemetry, profile=args.profile is not None or args.metrics_phases,
+                              two_phase=args.two_phase, scheduled=args.scheduled,
+                              recorder=recorder, metrics=metrics, count_ops=args.profile is not None)
+    if args.profile:
+        simulation.get_profiler().set_enabled(False)
+        simulation.get_profiler().dump(args.profile)
+    if telemetry is not None:
+        telemetry.close()
+    if recorder is not None:
+        recorder.close()
+    if metrics is not None:
+        metrics.close()
+    if args.save:
+        simulation.save(args.save)
+    simulation.print_stats()
+    simulation.clear()
+    print('--------------------------------------------------------------------------------------')
+    print(f'Steps: {args.steps}, simulated time: {simulation.get_time() / SIMULATION_SECOND} s')
+    print(f'Wall time: {elapsed:.3f} s, steps/sec: {args.steps / elapsed:.1f}')
+    cache_stats = simulation.get_target_cache_stats() if args.backend == 'objects' else None
+    for kind, stats in (cache_stats or dict()).items():
+        lookups = stats['hits'] + stats['misses']
+        print(f'Target cache {kind}: {stats["hits"]} hits, {stats["misses"]} misses'
+              + (f', hit rate {stats["hits"] / lookups:.1%}' if lookups else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from simulation import PREDATOR_STATE_NAMES, SIMULATION_SECOND, VICTIM_STATE_NAMES
+
+
+METRICS_DEFAULT_HOST = '127.0.0.1'
+METRICS_DEFAULT_PERIOD = 1.0  # wall clock seconds between samples
+METRICS_PREFIX = 'simulation'
+
+
+def parse_address(text):  # 'HOST:PORT' or ':PORT' for TCP, anything else is the path of a Unix socket
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit() and '/' not in text:
+        return host or METRICS_DEFAULT_HOST, int(port)
+    return text
+
+
+def _label(value):  # escaped as Prometheus label values need
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def to_prometheus(sample):  # the text exposition format, one family per metric
+    base = {'run': sample['run']} if sample['run'] is not None else dict()
+    families = [
+        ('time_seconds', 'gauge', 'Simulation time.', [(dict(), sample['time'] / SIMULATION_SECOND)]),
+        ('steps_total', 'counter', 'Steps taken since the metrics were attached.', [(dict(), sample['steps'])]),
+        ('steps_per_second', 'gauge', 'Steps per wall clock second since the previous sample.',
+         [(dict(), sample['steps_per_second'])]),
+        ('population', 'gauge', 'Agents by species and state.',
+         [({'species': species, 'state': state}, number) for species, states in sample['population'].items()
+          for state, number in states.items()]),
+        ('died_total', 'counter', 'Agents that died, victims once their body is gone.',
+         [({'species': species}, number) for species, number in sample['died'].items()]),
+        ('events_total', 'counter', 'Simulation events since the start of the run.',
+         [({'event': event}, number) for event, number in sample['events'].items()]),
+        ('phase_mean_seconds', 'gauge', 'Mean time of a phase over the profiler window, while profiling.',
+         [({'phase': phase}, ms / 1000) for phase, ms in sample['phases_ms'].items()]),
+    ]
+    lines = list()
+    for name, kind, help_text, values in families:
+        name = f'{METRICS_PREFIX}_{name}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in values:
+            labels = dict(base, **labels)
+            text = ','.join(f'{key}={_label(label)}' for key, label in labels.items())
+            lines.append(f'{name}{{{text}}} {value!r}' if text else f'{name} {value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        sample = self.server.metrics.get_sample()
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            self._send(to_prometheus(sample), 'text/plain; version=0.0.4; charset=utf-8')
+        elif path in ('/', '/metrics.json'):
+            self._send(json.dumps(sample), 'application/json')
+        else:
+            self.send_error(404)
+
+    def _send(self, text, content_type):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # scrapes would flood the output of the run
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+
+# Serves the state of a running simulation over HTTP, on localhost or a Unix socket: /metrics in the
+# Prometheus text format, / and /metrics.json as JSON. The simulation is only read by a step listener,
+# between ticks, at most once per period wall clock seconds; it publishes a fresh sample dict that
+# the server thread renders for every request, so requests never wait for or stall a tick
+class MetricsServer:
+
+    def __init__(self, address, period=METRICS_DEFAULT_PERIOD, run=None):
+        self._period = period
+        self._run = run  # label of the run, to tell many runs apart
+        if isinstance(address, tuple):
+            self._server = ThreadingHTTPServer(address, MetricsRequestHandler)
+            self._server.daemon_threads = True
+            self._path = None
+        else:
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)  # left behind by a run that did not close
+            self._server = UnixHTTPServer(address, MetricsRequestHandler)
+            self._path = address
+        self._server.metrics = self
+        self._sample = self._empty_sample()
+        self._simulation = None
+        self._steps = 0
+        self._last_steps = 0
+        self._last_wall = None
+        self._next_wall = None
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def get_address(self):  # (host, port) with the port bound when 0 was asked for, or the socket path
+        return self._path if self._path is not None else self._server.server_address[:2]
+
+    def get_sample(self):
+        return self._sample
+
+    def _empty_sample(self):
+        return {'run': self._run, 'time': 0.0, 'steps': 0, 'steps_per_second': 0.0, 'population': dict(),
+                'died': dict(), 'events': dict(), 'phases_ms': dict()}
+
+    def attach(self, simulation):
+        self._simulation = simulation
+        self._steps = self._last_steps = 0
+        self._last_wall = time.perf_counter()
+        self._next_wall = self._last_wall + self._period
+        self._publish(simulation, self._last_wall)
+        simulation.add_step_listener(self.on_step)
+
+    def on_step(self, simulation):
+        self._steps += 1
+        wall = time.perf_counter()
+        if wall < self._next_wall:
+            return
+        self._next_wall = wall + self._period
+        self._publish(simulation, wall)
+
+    def _publish(self, simulation, wall):
+        elapsed = wall - self._last_wall
+        profiler = simulation.get_profiler()
+        self._sample = {  # replaced, never changed, so the server thread can read it as it is
+            'run': self._run,
+            'time': simulation.get_time(),
+            'steps': self._steps,
+            'steps_per_second': (self._steps - self._last_steps) / elapsed if elapsed > 0 else 0.0,
+            'population': {'victim': dict(zip(VICTIM_STATE_NAMES, simulation.get_victim_state_counts())),
+                           'predator': dict(zip(PREDATOR_STATE_NAMES, simulation.get_predator_state_counts()))},
+            'died': {'victim': simulation.get_victims_died(), 'predator': simulation.get_predators_died()},
+            'events': dict(simulation.get_event_counts()),
+            'phases_ms': profiler.get_means_ms() if profiler.is_enabled() else dict(),
+        }
+        self._last_steps = self._steps
+        self._last_wall = wall
+
+    def close(self):
+        if self._simulation is not None:
+            self._simulation.remove_step_listener(self.on_step)
+            self._simulation = None
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
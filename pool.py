@@ -0,0 +1,53 @@
+# Objects in the order they were spawned. Between defer() and apply() spawns and despawns are
+# queued, so the pool can be iterated directly while a tick adds and removes entities; apply()
+# then drops all despawned objects in one order-keeping pass, which stays linear however many
+# have died
+class EntityPool:
+
+    def __init__(self):
+        self._items = list()
+        self._members = set()
+        self._deferring = False
+        self._spawned = list()
+        self._despawned = list()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, obj):
+        return obj in self._members
+
+    def defer(self):
+        self._deferring = True
+
+    def spawn(self, obj):
+        if self._deferring:
+            self._spawned.append(obj)
+            return
+        self._members.add(obj)
+        self._items.append(obj)
+
+    def despawn(self, obj):
+        self._despawned.append(obj)
+        if not self._deferring:
+            self.apply()
+
+    def apply(self):  # also ends deferring
+        self._deferring = False
+        if self._despawned:
+            self._members.difference_update(self._despawned)
+            self._despawned.clear()
+            self._items = [obj for obj in self._items if obj in self._members]
+        spawned, self._spawned = self._spawned, list()
+        for obj in spawned:
+            self.spawn(obj)
+
+    def clear(self):
+        self._items.clear()
+        self._members.clear()
+        self._deferring = False
+        self._spawned.clear()
+        self._despawned.clear()
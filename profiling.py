@@ -0,0 +1,76 @@
+import json
+from collections import deque
+from statistics import mean
+
+import vecmath
+
+
+PROFILER_WINDOW = 600  # samples kept per phase
+PROFILER_PHASES = ('tick', 'state_update', 'predator_scan', 'partner_search', 'food_search', 'movement',
+                   'draw', 'gui')
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _histogram(values):  # power of two buckets in nanoseconds: [upper bound, count]
+    buckets = dict()
+    for value in values:
+        bound = 1 << max(0, int(value) - 1).bit_length()
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return [[bound, buckets[bound]] for bound in sorted(buckets)]
+
+
+# Rolling per-phase timings in nanoseconds, one sample per tick (or per frame for drawing).
+# Disabled by default; instrumented code checks is_enabled() once per tick and skips all timing otherwise
+class Profiler:
+
+    def __init__(self, window=PROFILER_WINDOW):
+        self._enabled = False
+        self._window = window
+        self._phases = {phase: deque(maxlen=window) for phase in PROFILER_PHASES}
+        self._op_counts = {name: deque(maxlen=window) for name in vecmath.VEC2_COUNTED_OPS.values()}
+        self._ticks = 0
+
+    def is_enabled(self):
+        return self._enabled
+
+    def set_enabled(self, enabled, count_ops=True):  # op counting slows Vec2 down, so timings can skip it
+        self._enabled = enabled
+        vecmath.set_op_counting(enabled and count_ops)
+        vecmath.take_op_counts()
+
+    def record(self, phase, ns):
+        if phase not in self._phases:
+            self._phases[phase] = deque(maxlen=self._window)
+        self._phases[phase].append(ns)
+
+    def end_tick(self):
+        self._ticks += 1
+        for name, count in vecmath.take_op_counts().items():
+            self._op_counts[name].append(count)
+
+    def get_means_ms(self):
+        return {phase: mean(samples) / 1e6 for phase, samples in self._phases.items() if samples}
+
+    def get_report(self):
+        phases = dict()
+        for phase, samples in self._phases.items():
+            if not samples:
+                continue
+            phases[phase] = {
+                'samples': len(samples),
+                'mean_ms': mean(samples) / 1e6,
+                'p50_ms': _percentile(samples, 0.5) / 1e6,
+                'p95_ms': _percentile(samples, 0.95) / 1e6,
+                'max_ms': max(samples) / 1e6,
+                'histogram_ns': _histogram(samples),
+            }
+        op_counts = {name: mean(samples) for name, samples in self._op_counts.items() if samples}
+        return {'ticks': self._ticks, 'window': self._window, 'phases': phases, 'vec2_ops_per_tick': op_counts}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.get_report(), f, indent=2)
@@ -0,0 +1,204 @@
+import pygame
+import numpy as np
+from itertools import repeat
+from time import perf_counter_ns
+
+from simulation import SIMULATION_METER, SIMULATION_SECOND
+from trajectory import TrajectoryFrame
+
+
+RENDER_VICTIM_COLOR = (0, 0, 255)
+RENDER_CORPSE_COLOR = (70, 70, 110)
+RENDER_VICTIM_FOOD_COLOR = (0, 255, 0)
+RENDER_DEPLETED_FOOD_COLOR = (0, 90, 0)
+RENDER_PREDATOR_COLOR = (255, 0, 0)
+RENDER_GUI_COLOR = (255, 255, 255)
+
+RENDER_ENTITY_SIZE = SIMULATION_METER / 2
+RENDER_FONT_SIZE = 18
+RENDER_LINE_HEIGHT = 16
+
+RENDER_MIN_ZOOM = 1 / 1024  # screen pixels per world unit
+RENDER_MAX_ZOOM = 16
+RENDER_HEATMAP_ZOOM = 0.5  # below this zoom a density heatmap is drawn instead of the agents
+RENDER_HEATMAP_TEXEL = 4  # smallest heatmap cell in screen pixels, bounds the heatmap size at any zoom
+RENDER_HEATMAP_COLORS = {'predators': RENDER_PREDATOR_COLOR, 'victim_foods': RENDER_VICTIM_FOOD_COLOR,
+                         'victims': RENDER_VICTIM_COLOR, 'corpses': RENDER_CORPSE_COLOR}  # at the densest cell
+
+
+# Which part of the world is shown: the world point at the top left corner of the screen and the
+# zoom in screen pixels per world unit
+class Camera:
+
+    def __init__(self, screen_size, world_size):
+        self._screen_size = screen_size
+        self._left = 0.0
+        self._top = 0.0
+        self._zoom = 1.0
+        if world_size[0] > screen_size[0] or world_size[1] > screen_size[1]:  # starts showing the whole world
+            self._zoom = min(screen_size[0] / world_size[0], screen_size[1] / world_size[1])
+
+    def get_zoom(self):
+        return self._zoom
+
+    def get_offset(self):
+        return self._left, self._top
+
+    def get_view_rect(self):  # (x0, y0, x1, y1) of the visible part of the world
+        return (self._left, self._top,
+                self._left + self._screen_size[0] / self._zoom, self._top + self._screen_size[1] / self._zoom)
+
+    def to_world(self, screen_pos):
+        return self._left + screen_pos[0] / self._zoom, self._top + screen_pos[1] / self._zoom
+
+    def pan(self, dx, dy):  # in screen pixels
+        self._left += dx / self._zoom
+        self._top += dy / self._zoom
+
+    def zoom_at(self, factor, screen_pos):  # keeps the world point under screen_pos in place
+        x, y = self.to_world(screen_pos)
+        self._zoom = min(max(self._zoom * factor, RENDER_MIN_ZOOM), RENDER_MAX_ZOOM)
+        self._left = x - screen_pos[0] / self._zoom
+        self._top = y - screen_pos[1] / self._zoom
+
+
+# Draws every entity of one kind as a copy of a sprite rendered once per color and size, so a frame
+# costs one Surface.blits call per kind instead of one pygame.draw call per entity. Only entities
+# inside the camera view are drawn, found through the simulation's spatial grids, and when zoomed
+# out far enough the grid cell counts are drawn as a heatmap instead, so the cost of a frame is
+# bounded by the screen rather than the population. Text lines are rendered again only when they change
+class Renderer:
+
+    def __init__(self, surf, camera=None):
+        self._surf = surf
+        self._camera = camera
+        self._scene = pygame.Surface(surf.get_size())
+        self._font = pygame.font.Font(None, RENDER_FONT_SIZE)
+        self._sprites = dict()  # (color, size) -> sprite
+        self._texts = dict()  # line number -> (text, rendered surface)
+
+    def get_camera(self):
+        return self._camera
+
+    def _get_sprite(self, color, size):
+        sprite = self._sprites.get((color, size))
+        if sprite is None:
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.ellipse(sprite, color, sprite.get_rect())
+            self._sprites[color, size] = sprite
+        return sprite
+
+    # Sprites are placed at the entity positions as they are on a scene surface, which is then drawn
+    # shifted by half a sprite to center them
+    def _draw_entities(self, entities, color, size):
+        if self._camera is None:
+            positions = [entity.get_position().as_tuple() for entity in entities]
+        else:
+            left, top = self._camera.get_offset()
+            zoom = self._camera.get_zoom()
+            positions = [((x - left) * zoom, (y - top) * zoom)
+                         for x, y in (entity.get_position().as_tuple() for entity in entities)]
+        self._scene.blits(zip(repeat(self._get_sprite(color, size)), positions), doreturn=False)
+
+    def _draw_points(self, points, color, size):  # as _draw_entities, for an array of positions
+        if self._camera is not None:
+            points = (points - self._camera.get_offset()) * self._camera.get_zoom()
+        self._scene.blits(zip(repeat(self._get_sprite(color, size)), points.tolist()), doreturn=False)
+
+    def _draw_frame(self, frame, rect, size):  # a recorded frame hands over arrays, no entity objects
+        for kind, color in (('corpses', RENDER_CORPSE_COLOR), ('victims', RENDER_VICTIM_COLOR),
+                            ('predators', RENDER_PREDATOR_COLOR)):
+            self._draw_points(frame.get_positions(kind, rect)[0], color, size)
+        positions, states = frame.get_positions('victim_foods', rect)
+        self._draw_points(positions[states != 0], RENDER_VICTIM_FOOD_COLOR, size)
+        self._draw_points(positions[states == 0], RENDER_DEPLETED_FOOD_COLOR, size)
+
+    def _draw_agents(self, simulation):
+        self._scene.fill((0, 0, 0))
+        rect = None
+        if self._camera is None:
+            size = max(1, round(RENDER_ENTITY_SIZE))
+        else:
+            size = max(1, round(RENDER_ENTITY_SIZE * self._camera.get_zoom()))
+            margin = RENDER_ENTITY_SIZE  # entities just outside the view still show in part
+            x0, y0, x1, y1 = self._camera.get_view_rect()
+            rect = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+        if isinstance(simulation, TrajectoryFrame):
+            self._draw_frame(simulation, rect, size)
+        else:
+            if rect is None:
+                victims, predators = simulation.get_victims(), simulation.get_predators()
+                foods, corpses = simulation.get_victim_foods(), simulation.get_corpses()
+            else:
+                victims = simulation.get_victims_in_rect(rect)
+                predators = simulation.get_predators_in_rect(rect)
+                foods = simulation.get_victim_foods_in_rect(rect)
+                corpses = simulation.get_corpses_in_rect(rect)
+            self._draw_entities(corpses, RENDER_CORPSE_COLOR, size)
+            self._draw_entities(victims, RENDER_VICTIM_COLOR, size)
+            self._draw_entities(predators, RENDER_PREDATOR_COLOR, size)
+            self._draw_entities([food for food in foods if food.is_available()], RENDER_VICTIM_FOOD_COLOR, size)
+            self._draw_entities([food for food in foods if not food.is_available()], RENDER_DEPLETED_FOOD_COLOR,
+                                size)
+        offset = -round(size / 2)
+        self._surf.blit(self._scene, (offset, offset))
+
+    # One texel per grid cell (or block of cells) of the visible area, each kind in its own color
+    # channel with the brightness showing the number of agents relative to the fullest cell
+    def _draw_heatmap(self, simulation):
+        rect = self._camera.get_view_rect()
+        zoom = self._camera.get_zoom()
+        left, top = self._camera.get_offset()
+        counts = simulation.get_cell_counts(rect, RENDER_HEATMAP_TEXEL / zoom)
+        cell_size = max(max(size for size, cells in counts.values()), RENDER_HEATMAP_TEXEL / zoom)
+        min_cx, min_cy = int(rect[0] // cell_size), int(rect[1] // cell_size)
+        shape = (int(rect[2] // cell_size) - min_cx + 1, int(rect[3] // cell_size) - min_cy + 1)
+        heat = np.zeros(shape + (3,))
+        density = np.zeros(shape)
+        for kind, (size, cells) in counts.items():
+            if not cells:
+                continue
+            cells = np.array(cells, dtype=np.float64)
+            # cells of a finer grid are summed into the heatmap cell holding their corner
+            cx = np.clip((cells[:, 0] * size // cell_size).astype(np.int64) - min_cx, 0, shape[0] - 1)
+            cy = np.clip((cells[:, 1] * size // cell_size).astype(np.int64) - min_cy, 0, shape[1] - 1)
+            density[:] = 0
+            np.add.at(density, (cx, cy), cells[:, 2])
+            heat += (density / density.max())[:, :, None] * RENDER_HEATMAP_COLORS[kind]
+        texture = pygame.surfarray.make_surface(np.minimum(heat, 255).astype(np.uint8))
+        scaled = pygame.transform.scale(texture, (round(shape[0] * cell_size * zoom), round(shape[1] * cell_size * zoom)))
+        self._surf.blit(scaled, (round((min_cx * cell_size - left) * zoom), round((min_cy * cell_size - top) * zoom)))
+
+    def _draw_text(self, line, text):
+        cached = self._texts.get(line)
+        if cached is None or cached[0] != text:
+            cached = (text, self._font.render(text, 1, RENDER_GUI_COLOR))
+            self._texts[line] = cached
+        self._surf.blit(cached[1], (0, RENDER_LINE_HEIGHT * line))
+
+    def _draw_gui(self, simulation):
+        self._draw_text(0, f'Время: {simulation.get_time() / SIMULATION_SECOND}')
+
+    def _draw_profile(self, profiler):
+        op_counts = profiler.get_report()['vec2_ops_per_tick']
+        lines = [f'{phase}: {ms:.2f} ms' for phase, ms in profiler.get_means_ms().items()]
+        lines += [f'Vec2 {name}/tick: {count:.0f}' for name, count in op_counts.items()]
+        for i, line in enumerate(lines):
+            self._draw_text(i + 1, line)
+
+    def draw(self, simulation):
+        profiler = simulation.get_profiler()
+        profiling = profiler.is_enabled()
+        if profiling:
+            start = perf_counter_ns()
+        if self._camera is not None and self._camera.get_zoom() < RENDER_HEATMAP_ZOOM:
+            self._draw_heatmap(simulation)
+        else:
+            self._draw_agents(simulation)
+        if profiling:
+            profiler.record('draw', perf_counter_ns() - start)
+            start = perf_counter_ns()
+        self._draw_gui(simulation)
+        if profiling:
+            profiler.record('gui', perf_counter_ns() - start)
+            self._draw_profile(profiler)
@@ -0,0 +1,48 @@
+import heapq
+
+
+# Keys (agents) waiting for a simulation time. Each key has at most one pending time: scheduling
+# it again replaces the earlier one, which stays in the heap and is skipped when it comes up
+class EventScheduler:
+
+    def __init__(self):
+        self._heap = list()  # (due, sequence number, key)
+        self._pending = dict()  # key -> sequence number of its live heap entry
+        self._due = dict()  # key -> due time
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def get_due(self, key):  # None when nothing is pending for key
+        return self._due.get(key)
+
+    def schedule(self, key, due):
+        self._sequence += 1
+        self._pending[key] = self._sequence
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, self._sequence, key))
+
+    def cancel(self, key):
+        if self._pending.pop(key, None) is not None:
+            del self._due[key]
+
+    def pop_due(self, time):  # keys due at or before time, earliest first
+        heap = self._heap
+        found = list()
+        while heap and heap[0][0] <= time:
+            due, sequence, key = heapq.heappop(heap)
+            if self._pending.get(key) == sequence:
+                del self._pending[key]
+                del self._due[key]
+                found.append(key)
+        return found
+
+    def clear(self):
+        self._heap.clear()
+        self._pending.clear()
+        self._due.clear()
+        self._sequence = 0
@@ -0,0 +1,1495 @@
+from vecmath import Vec2, distance_sq
+from spatial import SpatialGrid
+from pool import EntityPool
+from scheduler import EventScheduler
+from wander import WanderStream, WANDER_DEFAULT_STREAM
+from targets import TargetCache
+from profiling import Profiler
+from collections import deque
+from math import pi, sqrt
+from time import perf_counter_ns
+import dataclasses
+import functools
+
+import random
+
+
+SIMULATION_WORLD_SIZE = (640, 480)
+
+SIMULATION_METER = 8
+SIMULATION_SECOND = 1000
+SIMULATION_TIME_FACTOR = 25
+SIMULATION_MAX_STEPS_PER_LOOP = 100  # fixed step mode drops the backlog beyond this
+SIMULATION_CONTACT_DISTANCE = 0.5 * SIMULATION_METER  # close enough to eat or mate
+SIMULATION_CONTACT_DISTANCE_SQ = SIMULATION_CONTACT_DISTANCE ** 2
+SIMULATION_SCHEDULE_SLACK = 1e-9  # share of the magnitudes involved by which due times come early
+
+# States every species goes through, numbered alike so one agent kernel serves them all
+AGENT_FIND_FOOD_STATE = 0
+AGENT_FIND_PARTNER_STATE = 1
+AGENT_NORMAL_STATE = 2
+AGENT_DEAD_STATE = 3
+AGENT_SCARY_STATE = 5  # only species that flee from another get scared
+
+VICTIM_FIND_FOOD_STATE = AGENT_FIND_FOOD_STATE
+VICTIM_FIND_PARTNER_STATE = AGENT_FIND_PARTNER_STATE
+VICTIM_NORMAL_STATE = AGENT_NORMAL_STATE
+VICTIM_DEAD_BODY_STATE = AGENT_DEAD_STATE
+VICTIM_ROTTEN_BODY_STATE = 4
+VICTIM_SCARY_STATE = AGENT_SCARY_STATE
+
+VICTIM_STATE_NAMES = ('find_food', 'find_partner', 'normal', 'dead_body', 'rotten_body', 'scary')  # by state
+
+VICTIM_HUNGER_WANT_EAT_THRESHOLD = 1000
+VICTIM_HUNGER_WANT_PARTNER_THRESHOLD = 500
+VICTIM_HUNGER_DIE_THRESHOLD = 5000
+VICTIM_HUNGER_GROWTH_SPEED = 1 / SIMULATION_SECOND
+VICTIM_EAT_SPEED = 5 / SIMULATION_SECOND  # hunger units
+
+VICTIM_INIT_HP = 3
+
+VICTIM_BABY_PERIOD = 500 * SIMULATION_SECOND  # sim second
+VICTIM_GETS_ROTTEN_PERIOD = 1000 * SIMULATION_SECOND
+
+VICTIM_NORMAL_SPEED = 0.5 * SIMULATION_METER / SIMULATION_SECOND  # per second
+
+VICTIM_VIEW_RADIUS = 10 * SIMULATION_METER
+VICTIM_SCARY_RADIUS = 0.5 * VICTIM_VIEW_RADIUS
+
+
+PREDATOR_FIND_FOOD_STATE = AGENT_FIND_FOOD_STATE
+PREDATOR_FIND_PARTNER_STATE = AGENT_FIND_PARTNER_STATE
+PREDATOR_NORMAL_STATE = AGENT_NORMAL_STATE
+PREDATOR_DEAD_STATE = AGENT_DEAD_STATE
+
+PREDATOR_STATE_NAMES = ('find_food', 'find_partner', 'normal', 'dead')
+
+PREDATOR_HUNGER_WANT_EAT_THRESHOLD = 1000
+PREDATOR_HUNGER_WANT_PARTNER_THRESHOLD = 500
+PREDATOR_HUNGER_DIE_THRESHOLD = 5000
+PREDATOR_HUNGER_GROWTH_SPEED = 5 / SIMULATION_SECOND
+PREDATOR_EAT_SPEED = 100 / SIMULATION_SECOND  # hunger units
+PREDATOR_DAMAGE_SPEED = 0.3 / SIMULATION_SECOND
+PREDATOR_SLOWDOWN_HUNGER = 1000  # starving predators slow down: speed / max(1, hunger past the want eat threshold / this)
+
+PREDATOR_BABY_PERIOD = 1000 * SIMULATION_SECOND  # sim second
+
+PREDATOR_NORMAL_SPEED = 0.5 * SIMULATION_METER / SIMULATION_SECOND  # per second
+
+PREDATOR_VIEW_RADIUS = 10 * SIMULATION_METER
+
+VICTIM_FOOD_CAPACITY = 0  # hunger units a food patch holds, 0 for a patch that never runs out
+VICTIM_FOOD_REGROWTH_SPEED = VICTIM_EAT_SPEED / 10  # hunger units per sim millisecond
+VICTIM_FOOD_REGROWN_SHARE = 0.5  # share of the capacity an emptied patch needs before it can be found again
+
+VICTIMS_INIT_NUMBER = 200
+VICTIM_FOODS_INIT_NUMBER = 100
+PREDATORS_INIT_NUMBER = 100
+
+TARGET_CACHE_INTERVAL = 0  # ticks a found target is kept without a new search, 0 turns the cache off
+TARGET_CACHE_MOVE_THRESHOLD = 1 * SIMULATION_METER  # movement of the agent or its target that forces a search
+
+FAST_FORWARD_CONTACT = False  # long steps close in on targets, see get_contact_reach_sq; only for fast-forward runs
+
+SIMULATION_PROFILED_PHASES = ('tick', 'state_update', 'predator_scan', 'partner_search', 'food_search', 'movement')
+
+SIMULATION_EVENTS = ('victim_births', 'victim_deaths', 'victim_eats', 'predator_births', 'predator_deaths', 'predator_eats',
+                     'food_depletions', 'food_regrowths')
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulationConfig:
+    world_size: tuple = SIMULATION_WORLD_SIZE
+    victim_hunger_want_eat_threshold: float = VICTIM_HUNGER_WANT_EAT_THRESHOLD
+    victim_hunger_want_partner_threshold: float = VICTIM_HUNGER_WANT_PARTNER_THRESHOLD
+    victim_hunger_die_threshold: float = VICTIM_HUNGER_DIE_THRESHOLD
+    victim_hunger_growth_speed: float = VICTIM_HUNGER_GROWTH_SPEED
+    victim_eat_speed: float = VICTIM_EAT_SPEED
+    victim_init_hp: float = VICTIM_INIT_HP
+    victim_baby_period: float = VICTIM_BABY_PERIOD
+    victim_gets_rotten_period: float = VICTIM_GETS_ROTTEN_PERIOD
+    victim_normal_speed: float = VICTIM_NORMAL_SPEED
+    victim_view_radius: float = VICTIM_VIEW_RADIUS
+    victim_scary_radius: float = VICTIM_SCARY_RADIUS
+    predator_hunger_want_eat_threshold: float = PREDATOR_HUNGER_WANT_EAT_THRESHOLD
+    predator_hunger_want_partner_threshold: float = PREDATOR_HUNGER_WANT_PARTNER_THRESHOLD
+    predator_hunger_die_threshold: float = PREDATOR_HUNGER_DIE_THRESHOLD
+    predator_hunger_growth_speed: float = PREDATOR_HUNGER_GROWTH_SPEED
+    predator_eat_speed: float = PREDATOR_EAT_SPEED
+    predator_damage_speed: float = PREDATOR_DAMAGE_SPEED
+    predator_baby_period: float = PREDATOR_BABY_PERIOD
+    predator_normal_speed: float = PREDATOR_NORMAL_SPEED
+    predator_view_radius: float = PREDATOR_VIEW_RADIUS
+    victims_init_number: int = VICTIMS_INIT_NUMBER
+    victim_foods_init_number: int = VICTIM_FOODS_INIT_NUMBER
+    predators_init_number: int = PREDATORS_INIT_NUMBER
+    victim_food_capacity: float = VICTIM_FOOD_CAPACITY
+    victim_food_regrowth_speed: float = VICTIM_FOOD_REGROWTH_SPEED
+    target_cache_interval: int = TARGET_CACHE_INTERVAL  # object backend only
+    target_cache_move_threshold: float = TARGET_CACHE_MOVE_THRESHOLD
+    fast_forward_contact: bool = FAST_FORWARD_CONTACT
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    def with_world_size(self, world_size):  # keeps the initial densities of agents and food
+        factor = world_size[0] * world_size[1] / (self.world_size[0] * self.world_size[1])
+        return dataclasses.replace(self,
+                                   world_size=tuple(world_size),
+                                   victims_init_number=round(self.victims_init_number * factor),
+                                   victim_foods_init_number=round(self.victim_foods_init_number * factor),
+                                   predators_init_number=round(self.predators_init_number * factor))
+
+    @classmethod
+    def from_dict(cls, values):  # accepts lists where the config holds tuples, e.g. from JSON
+        types = {field.name: field.type for field in dataclasses.fields(cls)}
+        return cls(**{name: tuple(value) if types[name] is tuple else value for name, value in values.items()})
+
+
+SIMULATION_DEFAULT_CONFIG = SimulationConfig()
+
+
+# What tells one kind of agent from another. Agents of every species run the same kernel, the Agent
+# methods and the per-species loop of Simulation, which only read these values; the pools, grids,
+# state counts and checkpoint columns of a simulation are made per species, so a new species is an
+# Agent subclass and a new entry in get_species rather than another hot loop
+@dataclasses.dataclass(frozen=True)
+class Species:
+    name: str  # prefix of its events, target caches and checkpoint columns
+    kind: str  # its agents as a whole, as in density maps and the <kind>_died checkpoint value
+    agent_class: type  # an Agent subclass
+    init_number: int  # agents placed by setup
+    speed: float
+    view_radius: float  # partners and food are searched within it
+    wander_distance: float  # from the agent to a wander target
+    hunger_want_eat_threshold: float
+    hunger_want_partner_threshold: float
+    hunger_die_threshold: float
+    hunger_growth_speed: float
+    eat_speed: float  # hunger units per sim millisecond of eating
+    bite_speed: float  # taken from the food per sim millisecond of eating
+    baby_period: float
+    diet: str  # 'victim_food' for food patches, 'prey' for the agents of the prey species and their corpses
+    prey: str = None  # name of the species hunted on the 'prey' diet
+    init_hp: float = float('inf')  # agents without hp are never hurt to death
+    slowdown_hunger: float = None  # None for a speed that does not follow hunger, see PREDATOR_SLOWDOWN_HUNGER
+    flees: str = None  # name of the species it is scared of
+    scary_radius: float = 0.0
+    rot_period: float = None  # how long its corpse can be eaten, None when it leaves none
+    fast_forward_contact: bool = False  # see get_contact_reach_sq
+
+
+@functools.lru_cache(maxsize=None)
+def get_species(config):  # name -> Species for a config, in the order they are processed in a tick
+    return {
+        'victim': _configured_species(config, 'victim', 'victims', Victim, 'victim_food',
+                                      bite_speed=config.victim_eat_speed, init_hp=config.victim_init_hp,
+                                      flees='predator', scary_radius=config.victim_scary_radius,
+                                      rot_period=config.victim_gets_rotten_period),
+        # predators wander as far ahead as victims do
+        'predator': _configured_species(config, 'predator', 'predators', Predator, 'prey', prey='victim',
+                                        wander_distance=config.victim_view_radius,
+                                        bite_speed=config.predator_damage_speed,
+                                        slowdown_hunger=PREDATOR_SLOWDOWN_HUNGER),
+    }
+
+
+def _configured_species(config, name, kind, agent_class, diet, **values):  # the rest from the <name>_* config fields
+    def field(suffix):
+        return getattr(config, f'{name}_{suffix}')
+    values.setdefault('wander_distance', field('view_radius'))
+    values.setdefault('fast_forward_contact', config.fast_forward_contact)
+    return Species(name, kind, agent_class, getattr(config, f'{kind}_init_number'), field('normal_speed'),
+                   field('view_radius'), hunger_want_eat_threshold=field('hunger_want_eat_threshold'),
+                   hunger_want_partner_threshold=field('hunger_want_partner_threshold'),
+                   hunger_die_threshold=field('hunger_die_threshold'),
+                   hunger_growth_speed=field('hunger_growth_speed'), eat_speed=field('eat_speed'),
+                   baby_period=field('baby_period'), diet=diet, **values)
+
+
+PREDATOR_CHECKPOINT_FIELDS = {
+    'position': ('f8', (2,)),
+    'has_go_point': ('?', ()),
+    'go_point': ('f8', (2,)),
+    'go_angle': ('f8', ()),
+    'go_direction': ('f8', (2,)),
+    'hunger': ('f8', ()),
+    'baby_time': ('f8', ()),
+    'baby_elapsed': ('?', ()),
+    'eating': ('?', ()),
+    'state': ('i1', ()),
+}
+
+VICTIM_CHECKPOINT_FIELDS = {
+    'position': ('f8', (2,)),
+    'has_go_point': ('?', ()),
+    'go_point': ('f8', (2,)),
+    'go_angle': ('f8', ()),
+    'go_direction': ('f8', (2,)),
+    'hunger': ('f8', ()),
+    'hp': ('f8', ()),
+    'baby_time': ('f8', ()),
+    'baby_elapsed': ('?', ()),
+    'eating': ('?', ()),
+    'state': ('i1', ()),
+    'grid_order': ('i8', ()),  # rank among the victims and corpses
+}
+
+VICTIM_FOOD_CHECKPOINT_FIELDS = {
+    'position': ('f8', (2,)),
+    'mass': ('f8', ()),
+    'available': ('?', ()),
+    'grid_order': ('i8', ()),  # rank among the patches that can be found, -1 for emptied ones
+}
+
+TARGET_CACHE_CHECKPOINT_FIELDS = {  # agents and targets by their index in the saved records, -1 for no target
+    'agent': ('i8', ()),
+    'target': ('i8', ()),
+    'agent_position': ('f8', (2,)),
+    'target_position': ('f8', (2,)),
+    'tick': ('i8', ()),
+}
+
+CORPSE_CHECKPOINT_FIELDS = {
+    'position': ('f8', (2,)),
+    'has_go_point': ('?', ()),
+    'go_point': ('f8', (2,)),
+    'rotten_hp': ('f8', ()),
+    'rot_deadline': ('f8', ()),
+    'grid_order': ('i8', ()),  # rank among the victims and corpses, prey search prefers the first corpse
+}
+
+SCHEDULE_CHECKPOINT_FIELDS = {  # one record per agent, in pool order
+    'synced_at': ('f8', ()),  # the time its saved hunger and timers are as of
+    'due': ('f8', ()),  # inf when nothing is pending
+}
+
+
+# Hunger grows linearly and timers run at a constant rate, so the next time either reaches a limit
+# that can change the state of an agent is known in advance. Scheduled updates compute them in
+# closed form (Agent.sync) where polling sums the steps tick by tick, so the two differ by rounding,
+# far below SIMULATION_SCHEDULE_SLACK of the magnitudes involved. That slack is the tolerance of the
+# equivalence to polling: both take the same decisions, unless a limit is reached within it of the
+# time of a tick, where one may act a tick before the other. Due times come early by the slack, an
+# agent due before it has reached the limit is just checked again
+def next_change_time(time, hunger, growth_speed, thresholds, baby_timer):
+    slack = SIMULATION_SCHEDULE_SLACK
+    delays = [(threshold - hunger - slack * (abs(threshold) + abs(hunger))) / growth_speed
+              for threshold in thresholds if threshold > hunger and growth_speed > 0]
+    if not baby_timer.is_elapsed():
+        delays.append(baby_timer.get_remaining() - slack * baby_timer.get_period())
+    return time - slack * abs(time) + min(delays) if delays else None
+
+
+def nearest(position, entities):  # the first of the closest entities, None if there are none
+    if entities:
+        return min(entities, key=lambda x: distance_sq(position, x.get_position()))
+    return None
+
+
+# Squared distance from which an agent of species reaches its food or partner within a step of
+# sim_dt: the contact distance, unless the species is set up for fast-forward runs. Agents stop
+# within a step of their go point, so a step longer than the contact distance would leave them
+# short of contact for good, and a fleeing prey would outrun the contact distance every tick. With
+# fast_forward_contact and such a step an agent closes in on a target within the step plus the
+# contact distance, as the shorter steps it stands for would have kept it in contact, and meets it
+# that tick. This approximates the model, so only fast-forward runs turn it on
+def get_contact_reach_sq(species, sim_dt):
+    reach = species.speed * sim_dt
+    if not species.fast_forward_contact or reach <= SIMULATION_CONTACT_DISTANCE:
+        return SIMULATION_CONTACT_DISTANCE_SQ
+    return (reach + SIMULATION_CONTACT_DISTANCE) ** 2
+
+
+def get_contact_move(agent):  # the move into contact with the go point, None when already in contact
+    gap = agent.get_vec_to_go_point()
+    gap_sq = gap.length_squared()
+    if gap_sq <= SIMULATION_CONTACT_DISTANCE_SQ:
+        return None
+    return gap * (1 - SIMULATION_CONTACT_DISTANCE / sqrt(gap_sq))
+
+
+class Entity:
+
+    def __init__(self, position):
+        self._position = position
+
+    def set_position(self, pos):
+        self._position = pos
+
+    def get_position(self):
+        return self._position
+
+    def move(self, dp):
+        self._position = self._position + dp
+
+
+# The kernel every species shares: hunger that grows until the agent wants food, then a partner or
+# dies, a baby timer, wandering and walking to a go point. Subclasses only name their species and
+# add what is theirs alone, like the hp of a victim and the body it leaves
+class Agent(Entity):
+
+    SPECIES = None  # name of the species in get_species
+    STATE_NAMES = ()  # by state
+    CHECKPOINT_FIELDS = dict()  # a grid_order field ranks the agents among their corpses
+
+    def __init__(self, position, init_hunger=0.0, rng=WANDER_DEFAULT_STREAM, config=SIMULATION_DEFAULT_CONFIG):
+        super().__init__(position)
+        self._rng = rng
+        self._config = config
+        self._species = get_species(config)[self.SPECIES]
+        self._state = AGENT_NORMAL_STATE
+        self._hunger = init_hunger
+        self._hp = self._species.init_hp
+        self._go_point = None
+        self._go_angle = 0.0
+        self._go_cos, self._go_sin = 1.0, 0.0  # unit vector of the go angle
+        self._baby_timer = Timer(self._species.baby_period)
+        self._eating = False
+        self._synced_at = 0.0  # simulation time hunger and timers are advanced to, when updates are scheduled
+
+    def get_species(self):
+        return self._species
+
+    def get_state(self):
+        return self._state
+
+    def has_go_point(self):
+        return self._go_point is not None
+
+    def get_go_point(self):
+        return self._go_point
+
+    # Wandering turns the heading by a random angle, applied to its unit vector as a rotation so no
+    # cos or sin is needed here. A target clamped to the world edge picks a fresh heading
+    def set_go_point(self, point=None):
+        if point is None:
+            if self._go_point:
+                turn, turn_cos, turn_sin = self._rng.next_turn()
+                self._go_angle = (self._go_angle + turn) % (2 * pi)
+                self._go_cos, self._go_sin = (self._go_cos * turn_cos - self._go_sin * turn_sin,
+                                              self._go_sin * turn_cos + self._go_cos * turn_sin)
+            else:
+                self._go_angle, self._go_cos, self._go_sin = self._rng.next_heading()
+            x = self._go_cos * self._species.wander_distance + self._position.get_x()
+            y = self._go_sin * self._species.wander_distance + self._position.get_y()
+        else:
+            x, y = point.get_x(), point.get_y()
+        width, height = self._config.world_size
+        clamped_x = 0 if x < 0 else width if x > width else x  # as min(max(x, 0), width), without the calls
+        clamped_y = 0 if y < 0 else height if y > height else y
+        if clamped_x != x or clamped_y != y:
+            self._go_angle, self._go_cos, self._go_sin = self._rng.next_heading()
+        self._go_point = Vec2(clamped_x, clamped_y)
+
+    def wander(self, sim_dt):  # picks the next wander target once there is none or it is reached
+        if self._go_point is None or self.get_move_vector(sim_dt) is None:
+            self.set_go_point()
+
+    def get_speed(self):
+        species = self._species
+        if species.slowdown_hunger is None:
+            return species.speed
+        return species.speed / max((1, (self._hunger - species.hunger_want_eat_threshold) / species.slowdown_hunger))
+
+    def get_move_vector(self, sim_dt):  # None once the go point is within a step at full speed
+        species = self._species
+        dist_vec = (self._go_point - self._position)
+        reach = species.speed * sim_dt
+        if dist_vec.length_squared() <= reach * reach:
+            return None
+        return dist_vec.normalize() * (species.speed if species.slowdown_hunger is None else self.get_speed())
+
+    def get_vec_to_go_point(self):
+        if self._go_point:
+            return self._go_point - self.get_position()
+        return None
+
+    def can_make_baby(self):
+        return self._baby_timer.is_elapsed() and not self._eating and self._state == AGENT_FIND_PARTNER_STATE
+
+    def baby_made(self):
+        self._baby_timer.restart()
+
+    def make_baby(self, other):
+        if self.can_make_baby() and other.can_make_baby():
+            self.baby_made()
+            other.baby_made()
+            return type(self)((self._position + other.get_position()) / 2, rng=self._rng, config=self._config)
+        return None
+
+    def hurt(self, damage):
+        self._hp -= damage
+
+    def consume(self, amount):  # eaten by an agent of a species with 'prey' as its diet
+        self.hurt(amount)
+
+    def eat(self, dt, food):  # food is anything with consume(amount)
+        self._eating = True
+        self._hunger -= self._species.eat_speed * dt
+        food.consume(self._species.bite_speed * dt)
+        if self._hunger <= 0:
+            self._hunger = 0
+            self._eating = False
+
+    def get_checkpoint(self):
+        return {
+            'position': self._position.as_tuple(),
+            'has_go_point': self._go_point is not None,
+            'go_point': (self._go_point or Vec2()).as_tuple(),
+            'go_angle': self._go_angle,
+            'go_direction': (self._go_cos, self._go_sin),
+            'hunger': self._hunger,
+            'baby_time': self._baby_timer.get_time(),
+            'baby_elapsed': self._baby_timer.is_elapsed(),
+            'eating': self._eating,
+            'state': self._state,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, values, rng=WANDER_DEFAULT_STREAM, config=SIMULATION_DEFAULT_CONFIG):
+        agent = cls(Vec2(*values['position']), values['hunger'], rng, config)
+        if values['has_go_point']:
+            agent._go_point = Vec2(*values['go_point'])
+        agent._go_angle = values['go_angle']
+        agent._go_cos, agent._go_sin = values['go_direction']
+        agent._baby_timer.restore(values['baby_time'], values['baby_elapsed'])
+        agent._eating = values['eating']
+        agent._state = values['state']
+        return agent
+
+    def update(self, dt, threatened=False):
+        self.advance(dt)
+        self.update_state(threatened)
+
+    def advance(self, dt):
+        self._baby_timer.update(dt)
+        self._hunger += self._species.hunger_growth_speed * dt
+
+    # Advances hunger and timers to time, for scheduled updates. Both grow linearly between the
+    # changes made from outside, which sync first, so they are computed in closed form from the
+    # last sync, h0 + rate * (time - t0), rather than tick by tick. See next_change_time for how
+    # far this may differ from polling
+    def sync(self, time):
+        elapsed = time - self._synced_at
+        if elapsed:
+            self._baby_timer.update(elapsed)
+            self._hunger += self._species.hunger_growth_speed * elapsed
+        self._synced_at = time
+
+    def get_synced_at(self):
+        return self._synced_at
+
+    def set_synced_at(self, time):
+        self._synced_at = time
+
+    def get_next_change_time(self):  # when hunger or the baby timer next reach a limit, None if never
+        species = self._species
+        return next_change_time(self._synced_at, self._hunger, species.hunger_growth_speed,
+                                (species.hunger_want_partner_threshold, species.hunger_want_eat_threshold,
+                                 species.hunger_die_threshold), self._baby_timer)
+
+    def update_state(self, threatened=False):  # threatened by an agent of the species it flees
+        species = self._species
+        if self._hunger >= species.hunger_die_threshold or self._hp <= 0:
+            self._state = AGENT_DEAD_STATE
+        elif threatened:
+            self._state = AGENT_SCARY_STATE
+        elif self._hunger >= species.hunger_want_eat_threshold:
+            self._state = AGENT_FIND_FOOD_STATE
+        elif self._hunger < species.hunger_want_partner_threshold and self._baby_timer.is_elapsed() and not self._eating:
+            self._state = AGENT_FIND_PARTNER_STATE
+        elif not self._eating:
+            self._state = AGENT_NORMAL_STATE
+
+
+class Predator(Agent):
+
+    SPECIES = 'predator'
+    STATE_NAMES = PREDATOR_STATE_NAMES
+    CHECKPOINT_FIELDS = PREDATOR_CHECKPOINT_FIELDS
+
+
+class VictimFood(Entity):
+
+    def __init__(self, position, capacity=VICTIM_FOOD_CAPACITY):  # a capacity of 0 never runs out
+        super().__init__(position)
+        self._capacity = capacity
+        self._mass = capacity
+        self._available = True
+
+    def get_mass(self):
+        return self._mass
+
+    def is_available(self):  # False from the moment the patch is emptied until it has regrown enough
+        return self._available
+
+    def is_full(self):
+        return self._mass >= self._capacity
+
+    def consume(self, amount):
+        if self._capacity:
+            self._mass = max(0.0, self._mass - amount)
+            if self._mass == 0:
+                self._available = False
+
+    def regrow(self, amount):
+        self._mass = min(self._capacity, self._mass + amount)
+        if self._mass >= self._capacity * VICTIM_FOOD_REGROWN_SHARE:
+            self._available = True
+
+    def get_checkpoint(self):
+        return {'position': self._position.as_tuple(), 'mass': self._mass, 'available': self._available}
+
+    @classmethod
+    def from_checkpoint(cls, values, config=SIMULATION_DEFAULT_CONFIG):
+        food = cls(Vec2(*values['position']), config.victim_food_capacity)
+        food._mass = values['mass']
+        food._available = values['available']
+        return food
+
+
+class Victim(Agent):
+
+    SPECIES = 'victim'
+    STATE_NAMES = VICTIM_STATE_NAMES
+    CHECKPOINT_FIELDS = VICTIM_CHECKPOINT_FIELDS
+
+    def get_rotten_hp(self):  # what its corpse starts with
+        return self._species.init_hp * 2
+
+    def get_checkpoint(self):
+        return dict(super().get_checkpoint(), hp=self._hp)
+
+    @classmethod
+    def from_checkpoint(cls, values, rng=WANDER_DEFAULT_STREAM, config=SIMULATION_DEFAULT_CONFIG):
+        victim = super().from_checkpoint(values, rng, config)
+        victim._hp = values['hp']
+        return victim
+
+
+# What is left of an agent of a species with a rot period, such as a victim, once it has died. It
+# keeps drifting to the point the agent was heading for, as dead victims always did, until it is
+# there, and is eaten by the hunters of its species until it rots away at its deadline or when
+# nothing is left. With slots and no timers it is a fraction of a Victim
+class Corpse:
+
+    __slots__ = ('_position', '_go_point', '_rotten_hp', '_rot_deadline', '_species')
+
+    def __init__(self, position, go_point, rotten_hp, rot_deadline, species):
+        self._position = position
+        self._go_point = go_point
+        self._rotten_hp = rotten_hp
+        self._rot_deadline = rot_deadline
+        self._species = species
+
+    def get_position(self):
+        return self._position
+
+    def get_species(self):  # of the agent it was
+        return self._species
+
+    def get_state(self):
+        return AGENT_DEAD_STATE
+
+    def get_go_point(self):
+        return self._go_point
+
+    def get_rotten_hp(self):
+        return self._rotten_hp
+
+    def get_rot_deadline(self):
+        return self._rot_deadline
+
+    def get_move_vector(self, sim_dt, speed):  # None once the go point is reached
+        dist_vec = (self._go_point - self._position)
+        reach = speed * sim_dt
+        if dist_vec.length_squared() <= reach * reach:
+            return None
+        return dist_vec.normalize() * speed
+
+    def move(self, dp):
+        self._position = self._position + dp
+
+    def hurt(self, damage):
+        self._rotten_hp -= damage
+
+    def consume(self, amount):
+        self._rotten_hp -= amount
+
+    def get_checkpoint(self):
+        return {
+            'position': self._position.as_tuple(),
+            'has_go_point': self._go_point is not None,
+            'go_point': (self._go_point or Vec2()).as_tuple(),
+            'rotten_hp': self._rotten_hp,
+            'rot_deadline': self._rot_deadline,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, values, species):
+        return cls(Vec2(*values['position']), Vec2(*values['go_point']) if values['has_go_point'] else None,
+                   values['rotten_hp'], values['rot_deadline'], species)
+
+
+class TimeLine:
+
+    def __init__(self, time_factor, fixed_step=None):
+        self._time = 0
+        self._time_factor = time_factor
+        self._last_dt_ct = 0
+        self._fixed_step = fixed_step
+        self._accumulator = 0
+
+    def get_time(self):
+        return self._time
+
+    def get_delta_time(self):
+        result = self._time - self._last_dt_ct
+        self._last_dt_ct = self._time
+        return result
+
+    def update(self, dt):
+        self._time += dt * self._time_factor
+
+    def advance(self, sim_dt):
+        self._time += sim_dt
+        self._last_dt_ct = self._time
+
+    def get_fixed_step(self):
+        return self._fixed_step
+
+    def accumulate(self, dt, max_steps):
+        self._accumulator = min(self._accumulator + dt * self._time_factor, self._fixed_step * max_steps)
+
+    def take_fixed_step(self):
+        if self._accumulator >= self._fixed_step:
+            self._accumulator -= self._fixed_step
+            return True
+        return False
+
+    def get_checkpoint(self):
+        return {'time': self._time, 'last_dt_ct': self._last_dt_ct,
+                'fixed_step': self._fixed_step, 'accumulator': self._accumulator}
+
+    def restore_checkpoint(self, values):
+        self._time = values['time']
+        self._last_dt_ct = values['last_dt_ct']
+        self._fixed_step = values['fixed_step']
+        self._accumulator = values['accumulator']
+
+
+class Timer:
+
+    def __init__(self, period, periodic=False):
+        self._period = period
+        self._time = 0
+        self._periodic = periodic
+        self._elapsed = False
+
+    def set_period(self, period):
+        self._period = period
+
+    def restart(self):
+        self._time = 0
+        self._elapsed = False
+
+    def is_elapsed(self):
+        return self._elapsed
+
+    def get_time(self):
+        return self._time
+
+    def get_period(self):
+        return self._period
+
+    def get_remaining(self):
+        return self._period - self._time
+
+    def restore(self, time, elapsed):
+        self._time = time
+        self._elapsed = elapsed
+
+    def update(self, dt):
+        self._time += dt
+        if self._time >= self._period:
+            if self._periodic:
+                self._time = 0
+            else:
+                self._elapsed = True
+            return True
+        return False
+
+
+def print_stats(simulation):  # works with any backend that has the population getters
+    victim_states = simulation.get_victim_state_counts()
+    predator_states = simulation.get_predator_state_counts()
+    print(f'Victims: {simulation.get_victims_number()}')
+    print(f'Victims died: {simulation.get_victims_died()}')
+    print(f'Victims in state VICTIM_FIND_FOOD_STATE: {victim_states[VICTIM_FIND_FOOD_STATE]}')
+    print(f'Victims in state VICTIM_FIND_PARTNER_STATE: {victim_states[VICTIM_FIND_PARTNER_STATE]}')
+    print(f'Victims in state VICTIM_NORMAL_STATE: {victim_states[VICTIM_NORMAL_STATE]}')
+    print(f'Victims in state VICTIM_DEAD_BODY_STATE: {victim_states[VICTIM_DEAD_BODY_STATE]}')
+    print(f'Victims in state VICTIM_ROTTEN_BODY_STATE: {victim_states[VICTIM_ROTTEN_BODY_STATE]}')
+    print(f'Victims in state VICTIM_SCARY_STATE: {victim_states[VICTIM_SCARY_STATE]}')
+    print('--------------------------------------------------------------------------------------')
+    print(f'Predators: {simulation.get_predators_number()}')
+    print(f'Predators died: {simulation.get_predators_died()}')
+    print(f'Predators in state PREDATOR_FIND_FOOD_STATE: {predator_states[PREDATOR_FIND_FOOD_STATE]}')
+    print(f'Predators in state PREDATOR_FIND_PARTNER_STATE: {predator_states[PREDATOR_FIND_PARTNER_STATE]}')
+    print(f'Predators in state PREDATOR_NORMAL_STATE: {predator_states[PREDATOR_NORMAL_STATE]}')
+    print(f'Predators in state PREDATOR_DEAD_STATE: {predator_states[PREDATOR_DEAD_STATE]}')
+
+
+class Simulation:
+
+    def __init__(self, seed=None, fixed_sim_dt=None, config=SIMULATION_DEFAULT_CONFIG, two_phase=False,
+                 scheduled=False):
+        self._random = random.Random(seed)
+        self._wander = WanderStream(seed)
+        self._config = config
+        self._species = get_species(config)
+        self._two_phase = two_phase
+        # species name -> its agents, grid, state counts (kept up to date on every transition) and deaths
+        self._pools = {name: EntityPool() for name in self._species}
+        self._grids = {name: SpatialGrid(species.view_radius) for name, species in self._species.items()}
+        self._state_counts = {name: [0] * len(species.agent_class.STATE_NAMES)
+                              for name, species in self._species.items()}
+        self._died = dict.fromkeys(self._species, 0)  # for species that leave corpses, when the corpse is gone
+        self._victim_foods = EntityPool()
+        self._victim_foods_grid = SpatialGrid(self._config.victim_view_radius)
+        self._emptied_foods_grid = SpatialGrid(self._config.victim_view_radius)  # only drawn, never searched
+        # Corpses of every species, searched within the view radius of their hunters. A corpse keeps
+        # the order it had in the grid of its species, so the corpses grid shares those orders
+        self._corpses = EntityPool()
+        self._corpses_grid = SpatialGrid(max(species.view_radius for species in self._species.values()))
+        self._drifting_corpses = dict()  # corpses not at their go point yet, in the order they died
+        self._rotting_corpses = {name: deque() for name, species in self._species.items()
+                                 if species.rot_period is not None}  # by rot deadline, the order they died in
+        self._eaten_corpses = dict()  # eaten to nothing, they rot at the start of the next tick
+        # diet -> how food is found and eaten
+        self._food_finders = {'victim_food': self._find_victim_food, 'prey': self._find_prey}
+        self._feeders = {'victim_food': self._feed_on_food, 'prey': self._feed_on_prey}
+        self._time_line = TimeLine(SIMULATION_TIME_FACTOR, fixed_sim_dt)
+        self._events = dict.fromkeys(SIMULATION_EVENTS, 0)
+        self._step_listeners = list()
+        self._profiler = Profiler()
+        self._phase_ns = None
+        self._victim_food_mass = 0.0  # totals kept up to date as patches are eaten and regrow
+        self._growing_foods = dict()  # patches below capacity, in the order they were first eaten
+        self._tick_number = 0
+        self._target_caches = None
+        if self._config.target_cache_interval > 0:
+            self._target_caches = {kind: TargetCache(self._config.target_cache_move_threshold,
+                                                     self._config.target_cache_interval)
+                                   for kind in self._target_cache_pools()}
+        # With scheduled updates an agent's hunger and timers are only advanced and its state only
+        # evaluated when the scheduler says something is due, or when a scan, meal or birth changed it
+        self._scheduler = EventScheduler() if scheduled else None
+        self._due_now = set()  # agents to evaluate in the current tick
+        self._every_tick = set()  # agents evaluated on every tick, kept out of the scheduler
+        self._now = self._time_line.get_time()
+        self._previous_now = self._now
+        self._visiting = None  # agent of the sequential loop running now
+
+    def add_victim(self, victim):
+        if type(victim) != Victim:
+            raise TypeError('Argument should be Victim')
+        self._spawn(victim)
+
+    def add_victim_food(self, food):
+        if type(food) != VictimFood:
+            raise TypeError('Argument should be VictimFood')
+        self._victim_foods.spawn(food)
+        if food.is_available():
+            self._victim_foods_grid.insert(food)
+        else:
+            self._emptied_foods_grid.insert(food)
+        self._victim_food_mass += food.get_mass()
+        if not food.is_full():
+            self._growing_foods[food] = None
+
+    def add_predator(self, predator):
+        if type(predator) != Predator:
+            raise TypeError('Argument should be Predator')
+        self._spawn(predator)
+
+    def _spawn(self, agent):
+        name = agent.get_species().name
+        self._pools[name].spawn(agent)
+        self._grids[name].insert(agent)
+        self._state_counts[name][agent.get_state()] += 1
+        self._start_scheduling(agent)
+
+    def add_corpse(self, corpse, order):  # corpses are kept in the order they died, which their deadlines follow
+        name = corpse.get_species().name
+        self._corpses.spawn(corpse)
+        self._corpses_grid.insert(corpse, order)
+        if corpse.get_go_point() is not None:
+            self._drifting_corpses[corpse] = None
+        self._rotting_corpses[name].append(corpse)
+        if corpse.get_rotten_hp() <= 0:
+            self._eaten_corpses[corpse] = None
+        self._state_counts[name][AGENT_DEAD_STATE] += 1
+
+    def _start_scheduling(self, agent):  # polling would first update a new agent on the next tick
+        if self._scheduler is not None:
+            agent.set_synced_at(self._now)
+            self._scheduler.schedule(agent, self._now)
+
+    def _is_visited(self, agent):  # whether polling would already have updated agent in this tick
+        visiting = self._visiting
+        if visiting is None or type(agent) is not type(visiting):
+            return True
+        grid = self._grids[agent.get_species().name]
+        return grid.get_order(agent) <= grid.get_order(visiting)
+
+    def _sync(self, agent):  # before hunger or timers of an agent are changed from outside its update
+        if self._scheduler is not None:
+            agent.sync(self._now if self._is_visited(agent) else self._previous_now)
+
+    def _advance_schedule(self):  # at the start of a tick, pops the agents due
+        self._previous_now, self._now = self._now, self._time_line.get_time()
+        self._due_now = set(self._scheduler.pop_due(self._now))
+        self._due_now.update(self._every_tick)
+
+    def _touch(self, agent):  # after an agent was changed from outside its update
+        if self._scheduler is None:
+            return
+        if self._is_visited(agent):
+            self._scheduler.schedule(agent, self._now)  # evaluated on the next tick
+        else:
+            self._due_now.add(agent)
+
+    def _reschedule(self, agent):
+        if agent.get_species().slowdown_hunger is not None and agent.get_state() == AGENT_FIND_FOOD_STATE:
+            if agent not in self._every_tick:  # its speed follows its hunger, so it is advanced on every tick
+                self._every_tick.add(agent)
+                self._scheduler.cancel(agent)
+            return
+        self._every_tick.discard(agent)
+        due = agent.get_next_change_time()
+        if due is None:
+            self._scheduler.cancel(agent)
+        else:
+            self._scheduler.schedule(agent, due)
+
+    def _mate(self, agent, partner):  # the baby joins the pool of its parents once the tick is over
+        self._sync(agent)
+        self._sync(partner)
+        baby = agent.make_baby(partner)
+        if baby:
+            self._touch(agent)
+            self._touch(partner)
+            self._spawn(baby)
+            self._events[f'{baby.get_species().name}_births'] += 1
+
+    def _feed_on_prey(self, hunter, prey, sim_dt):  # prey is an agent or a corpse
+        self._sync(hunter)
+        hunter.eat(sim_dt, prey)
+        self._touch(hunter)
+        if type(prey) is not Corpse:
+            self._touch(prey)
+        elif prey.get_rotten_hp() <= 0:
+            self._eaten_corpses[prey] = None
+        self._events[f'{hunter.get_species().name}_eats'] += 1
+
+    def _random_position(self):
+        return Vec2(self._random.randint(0, self._config.world_size[0]),
+                    self._random.randint(0, self._config.world_size[1]))
+
+    def setup(self):
+        for species in self._species.values():
+            for i in range(species.init_number):
+                init_hunger = self._random.uniform(0, 400)
+                self._spawn(species.agent_class(self._random_position(), init_hunger, self._wander, self._config))
+
+        for i in range(self._config.victim_foods_init_number):
+            self.add_victim_food(VictimFood(self._random_position(), self._config.victim_food_capacity))
+
+    def _cached_target(self, kind, agent, search, is_valid):
+        if self._target_caches is None:
+            return search(agent)
+        cache = self._target_caches[kind]
+        hit, target = cache.lookup(agent, self._tick_number, is_valid)
+        if not hit:
+            target = search(agent)
+            cache.store(agent, target, self._tick_number)
+        return target
+
+    def _find_partner(self, agent, species):
+        grid, radius = self._grids[species.name], species.view_radius
+        if self._target_caches is None:
+            return self._search_partner(agent, grid, radius)
+        radius_sq = radius * radius
+        return self._cached_target(f'{species.name}_partner', agent, lambda x: self._search_partner(x, grid, radius),
+                                   lambda x: x in grid and x.can_make_baby()
+                                   and distance_sq(agent.get_position(), x.get_position()) <= radius_sq)
+
+    def _find_victim_food(self, agent):
+        radius_sq = agent.get_species().view_radius ** 2
+        return self._cached_target(f'{agent.get_species().name}_food', agent, self._search_victim_food,
+                                   lambda x: x in self._victim_foods_grid
+                                   and distance_sq(agent.get_position(), x.get_position()) <= radius_sq)
+
+    def _find_prey(self, hunter):
+        species = hunter.get_species()
+        grid, radius_sq = self._grids[species.prey], species.view_radius ** 2
+        return self._cached_target(f'{species.name}_food', hunter, self._search_prey,
+                                   lambda x: (x in grid or x in self._corpses_grid)
+                                   and distance_sq(hunter.get_position(), x.get_position()) <= radius_sq)
+
+    def _search_partner(self, agent, grid, radius):
+        return nearest(agent.get_position(), [other for other in grid.query_radius(agent.get_position(), radius)
+                                              if other != agent and other.can_make_baby()])
+
+    def _search_victim_food(self, agent):
+        return nearest(agent.get_position(),
+                       self._victim_foods_grid.query_radius(agent.get_position(), agent.get_species().view_radius))
+
+    # The nearest agent of the prey species, though any corpse of that species in view comes first
+    def _search_prey(self, hunter):
+        species = hunter.get_species()
+        position, prey = hunter.get_position(), self._species[species.prey]
+        foods = self._grids[prey.name].query_radius(position, species.view_radius)
+        corpses = [corpse for corpse in self._corpses_grid.query_radius(position, species.view_radius)
+                   if corpse.get_species() is prey]
+        if corpses:  # in the order they were found in when corpses were still agents
+            foods = sorted(foods + corpses, key=self._body_order)
+        if foods:
+            return min(foods, key=lambda x: distance_sq(position, x.get_position()) * (x.get_state() != AGENT_DEAD_STATE))
+        return None
+
+    def _body_order(self, body):  # corpses keep the grid order of the agent they were
+        grid = self._corpses_grid if type(body) is Corpse else self._grids[body.get_species().name]
+        return grid.get_order(body)
+
+    def _update_agent(self, agent, sim_dt, threatened):  # returns False once the agent has died
+        old_state = agent.get_state()
+        if self._scheduler is None:
+            agent.update(sim_dt, threatened)
+        elif agent in self._due_now or threatened != (old_state == AGENT_SCARY_STATE):
+            agent.sync(self._now)
+            agent.update_state(threatened)
+            self._reschedule(agent)
+        else:
+            return True
+        state = agent.get_state()
+        if state != old_state:
+            counts = self._state_counts[agent.get_species().name]
+            counts[old_state] -= 1
+            counts[state] += 1
+        if state == AGENT_DEAD_STATE:
+            self._remove_dead(agent)
+            return False
+        return True
+
+    def _remove_dead(self, agent):  # an agent that has just died leaves its pool, maybe for a corpse
+        species = agent.get_species()
+        name = species.name
+        self._events[f'{name}_deaths'] += 1
+        self._state_counts[name][AGENT_DEAD_STATE] -= 1
+        if species.rot_period is None:
+            self._died[name] += 1
+        else:
+            self._bury(agent, species)  # counted as died once the corpse is gone
+        self._pools[name].despawn(agent)
+        self._grids[name].remove(agent)
+        if self._scheduler is not None:
+            self._scheduler.cancel(agent)
+            self._every_tick.discard(agent)
+        if self._target_caches is not None:
+            self._target_caches[f'{name}_food'].discard(agent)
+            self._target_caches[f'{name}_partner'].discard(agent)
+
+    def _bury(self, agent, species):  # adds the corpse of an agent that has just died, before it leaves the grid
+        corpse = Corpse(agent.get_position(), agent.get_go_point(), agent.get_rotten_hp(),
+                        self._time_line.get_time() + species.rot_period, species)
+        self.add_corpse(corpse, self._grids[species.name].get_order(agent))
+
+    def _drift_corpses(self, sim_dt, species=None):  # those of one species, or all of them
+        for corpse in list(self._drifting_corpses):
+            if species is not None and corpse.get_species() is not species:
+                continue
+            move_vector = corpse.get_move_vector(sim_dt, corpse.get_species().speed)
+            if move_vector is None:
+                del self._drifting_corpses[corpse]
+            else:
+                corpse.move(move_vector * sim_dt)
+                self._corpses_grid.update(corpse)
+
+    def _rot_corpses(self):  # at the start of a tick, like dead victims used to rot on their next update
+        rotten = list(self._eaten_corpses)
+        self._eaten_corpses.clear()
+        time = self._time_line.get_time()
+        for rotting in self._rotting_corpses.values():
+            while rotting and rotting[0].get_rot_deadline() <= time:
+                rotten.append(rotting.popleft())
+        for corpse in rotten:
+            if corpse not in self._corpses_grid:  # eaten and past its deadline
+                continue
+            name = corpse.get_species().name
+            self._corpses.despawn(corpse)
+            self._corpses_grid.remove(corpse)
+            self._drifting_corpses.pop(corpse, None)
+            self._state_counts[name][AGENT_DEAD_STATE] -= 1
+            self._died[name] += 1
+
+    def _flee(self, agent, threats):
+        position = agent.get_position()
+        x, y = position.as_tuple()
+        flee_x = flee_y = 0.0  # sum of the unit vectors away from the threats
+        for threat in threats:
+            away_x, away_y = x - threat.get_position().get_x(), y - threat.get_position().get_y()
+            if away_x * away_x + away_y * away_y != 0:  # a threat right on top of the agent gives no direction
+                length = sqrt(away_x ** 2 + away_y ** 2)
+                flee_x += away_x / length
+                flee_y += away_y / length
+        if flee_x == 0 and flee_y == 0:
+            agent.set_go_point()
+        else:
+            agent.set_go_point(Vec2(flee_x, flee_y).normalize() * agent.get_species().view_radius + position)
+
+    def _feed_on_food(self, agent, food, sim_dt):
+        mass = food.get_mass()
+        self._sync(agent)
+        agent.eat(sim_dt, food)
+        self._touch(agent)
+        self._victim_food_mass -= mass - food.get_mass()
+        self._events[f'{agent.get_species().name}_eats'] += 1
+        if not food.is_full():
+            self._growing_foods[food] = None
+        if not food.is_available() and food in self._victim_foods_grid:
+            self._victim_foods_grid.remove(food)
+            self._emptied_foods_grid.insert(food)
+            self._events['food_depletions'] += 1
+
+    def _regrow_victim_foods(self, sim_dt):  # only patches below capacity are visited
+        amount = self._config.victim_food_regrowth_speed * sim_dt
+        if amount == 0:
+            return
+        for food in list(self._growing_foods):
+            mass = food.get_mass()
+            food.regrow(amount)
+            self._victim_food_mass += food.get_mass() - mass
+            if food.is_available() and food not in self._victim_foods_grid:
+                self._emptied_foods_grid.remove(food)
+                self._victim_foods_grid.insert(food)
+                self._events['food_regrowths'] += 1
+            if food.is_full():
+                del self._growing_foods[food]
+
+    # Decides where an agent goes in the state it is in. Returns the partner or the food it has
+    # reached, if any, for the caller to mate or feed now or once every agent has decided
+    def _steer(self, agent, species, sim_dt, threats, spent):
+        state = agent.get_state()
+        if state == AGENT_SCARY_STATE:
+            self._flee(agent, threats)
+        elif state == AGENT_NORMAL_STATE:
+            agent.wander(sim_dt)
+        elif state == AGENT_FIND_PARTNER_STATE:
+            if spent is not None:
+                t = perf_counter_ns()
+            partner = self._find_partner(agent, species)
+            if spent is not None:
+                spent['partner_search'] += perf_counter_ns() - t
+            if partner is not None:
+                agent.set_go_point(partner.get_position())
+                amv = agent.get_vec_to_go_point()
+                if amv is None or amv.length_squared() <= get_contact_reach_sq(species, sim_dt):
+                    return partner, None
+            else:
+                agent.wander(sim_dt)
+        elif state == AGENT_FIND_FOOD_STATE:
+            if spent is not None:
+                t = perf_counter_ns()
+            food = self._food_finders[species.diet](agent)
+            if spent is not None:
+                spent['food_search'] += perf_counter_ns() - t
+            if food is not None:
+                agent.set_go_point(food.get_position())
+                amv = agent.get_vec_to_go_point()
+                if amv is None or amv.length_squared() <= get_contact_reach_sq(species, sim_dt):
+                    return None, food
+            else:
+                agent.wander(sim_dt)
+        return None, None
+
+    def _process_species(self, species, sim_dt):
+        spent = self._phase_ns  # None unless profiling
+        threat_grid = self._grids[species.flees] if species.flees is not None else None
+        grid = self._grids[species.name]
+        feed = self._feeders[species.diet]
+        due_now = self._due_now if self._scheduler is not None else None
+        threats = ()
+        for agent in self._pools[species.name]:
+            self._visiting = agent
+            if threat_grid is not None:
+                if spent is not None:
+                    t = perf_counter_ns()
+                threats = threat_grid.query_radius(agent.get_position(), species.scary_radius)
+                if spent is not None:
+                    spent['predator_scan'] += perf_counter_ns() - t
+            threatened = len(threats) != 0
+            # with scheduled updates an agent with nothing due and no threat come or gone is idle, its state stands
+            if due_now is None or agent in due_now or threatened != (agent.get_state() == AGENT_SCARY_STATE):
+                if spent is not None:
+                    t = perf_counter_ns()
+                alive = self._update_agent(agent, sim_dt, threatened)
+                if spent is not None:
+                    spent['state_update'] += perf_counter_ns() - t
+                if not alive:
+                    continue
+            if agent.get_state() == AGENT_NORMAL_STATE:
+                # a wanderer needs no steering while its go point is more than a step away, it only walks
+                if spent is not None:
+                    t = perf_counter_ns()
+                move_vector = agent.get_move_vector(sim_dt) if agent.has_go_point() else None
+                if move_vector is None:
+                    agent.set_go_point()
+                    move_vector = agent.get_move_vector(sim_dt)
+            else:
+                partner, food = self._steer(agent, species, sim_dt, threats, spent)
+                if partner is not None or food is not None:
+                    contact_move = get_contact_move(agent) if species.fast_forward_contact else None
+                    if contact_move is not None:
+                        agent.move(contact_move)
+                        grid.update(agent)
+                    if partner is not None:
+                        self._mate(agent, partner)
+                    else:
+                        feed(agent, food, sim_dt)
+                if spent is not None:
+                    t = perf_counter_ns()
+                move_vector = agent.get_move_vector(sim_dt)
+            if move_vector is not None:
+                agent.move(move_vector * sim_dt)
+                grid.update(agent)
+            if spent is not None:
+                spent['movement'] += perf_counter_ns() - t
+
+    # Two-phase tick: every agent first decides what to do against the world as it was at the start
+    # of the tick (states are updated first, positions and hp do not change), then meals, births and
+    # moves are applied together. Agents mate only when they chose each other, so nobody gets two
+    # partners, and all predators feeding on a victim hurt it. The outcome does not depend on the
+    # order agents are processed in, apart from the order random numbers are drawn
+    def _process_two_phase(self, sim_dt):
+        spent = self._phase_ns
+        if spent is not None:
+            t = perf_counter_ns()
+        scared = dict()
+        for species in self._species.values():
+            threat_grid = self._grids[species.flees] if species.flees is not None else None
+            threats = ()
+            for agent in self._pools[species.name]:
+                if threat_grid is not None:
+                    threats = threat_grid.query_radius(agent.get_position(), species.scary_radius)
+                if self._update_agent(agent, sim_dt, len(threats) != 0):
+                    if agent.get_state() == AGENT_SCARY_STATE:
+                        scared[agent] = threats
+        if spent is not None:
+            spent['state_update'] += perf_counter_ns() - t
+            t = perf_counter_ns()
+
+        meals = list()  # (agent, food, feeder)
+        partners = {name: dict() for name in self._species}
+        moves = list()  # (agent, grid, displacement)
+        for species in self._species.values():
+            grid, chosen, feed = self._grids[species.name], partners[species.name], self._feeders[species.diet]
+            for agent in self._pools[species.name]:
+                if agent.get_state() == AGENT_DEAD_STATE:  # removed once the tick is over
+                    continue
+                partner, food = self._steer(agent, species, sim_dt, scared.get(agent), None)
+                if partner is not None:
+                    chosen[agent] = partner
+                elif food is not None:
+                    meals.append((agent, food, feed))
+                move = None
+                if species.fast_forward_contact and (partner is not None or food is not None):
+                    move = get_contact_move(agent)
+                if move is None:
+                    move = agent.get_move_vector(sim_dt)
+                    if move is not None:
+                        move = move * sim_dt
+                if move is not None:
+                    moves.append((agent, grid, move))
+        if spent is not None:
+            spent['intents'] = perf_counter_ns() - t
+            t = perf_counter_ns()
+
+        for agent, food, feed in meals:
+            feed(agent, food, sim_dt)
+        for chosen in partners.values():
+            for agent, partner in chosen.items():
+                if chosen.get(partner) is agent:
+                    self._mate(agent, partner)  # no baby for the second of the pair, both timers are restarted
+        for agent, grid, move in moves:
+            agent.move(move)
+            grid.update(agent)
+        self._drift_corpses(sim_dt)
+        if spent is not None:
+            spent['resolve'] = perf_counter_ns() - t
+
+    def get_victims(self):
+        return self._pools['victim']
+
+    def get_victim_foods(self):
+        return self._victim_foods
+
+    def get_corpses(self):
+        return self._corpses
+
+    def get_predators(self):
+        return self._pools['predator']
+
+    # The *_in_rect getters find what lies in rect = (x0, y0, x1, y1) through the spatial grids,
+    # so their cost follows the size of the rect rather than the population
+    def get_victims_in_rect(self, rect):
+        return self._grids['victim'].query_rect(*rect)
+
+    def get_victim_foods_in_rect(self, rect):  # emptied patches too, they are kept in a grid of their own
+        return self._victim_foods_grid.query_rect(*rect) + self._emptied_foods_grid.query_rect(*rect)
+
+    def get_predators_in_rect(self, rect):
+        return self._grids['predator'].query_rect(*rect)
+
+    def get_corpses_in_rect(self, rect):
+        return self._corpses_grid.query_rect(*rect)
+
+    # kind -> (cell size, [(cell x, cell y, number), ...]) for density maps, with cells at least
+    # min_cell_size wide where the grids keep such coarse counts
+    def get_cell_counts(self, rect, min_cell_size=0):
+        grids = {species.kind: self._grids[name] for name, species in self._species.items()}
+        grids.update(victim_foods=self._victim_foods_grid, corpses=self._corpses_grid)
+        return {kind: grid.get_cell_counts(*rect, min_cell_size) for kind, grid in grids.items()}
+
+    def get_time(self):
+        return self._time_line.get_time()
+
+    def get_config(self):
+        return self._config
+
+    def is_two_phase(self):
+        return self._two_phase
+
+    def is_scheduled(self):
+        return self._scheduler is not None
+
+    def get_victims_number(self):  # counts corpses, like the numpy backend counts dead bodies
+        return len(self._pools['victim']) + len(self._corpses)
+
+    def get_victim_foods_available(self):  # patches that are not emptied
+        return len(self._victim_foods_grid)
+
+    def get_victim_food_mass(self):  # total over all patches, those that never run out count as 0
+        return self._victim_food_mass
+
+    def get_predators_number(self):
+        return len(self._pools['predator'])
+
+    def get_victims_died(self):
+        return self._died['victim']
+
+    def get_predators_died(self):
+        return self._died['predator']
+
+    def get_victim_state_counts(self):
+        return list(self._state_counts['victim'])
+
+    def get_predator_state_counts(self):
+        return list(self._state_counts['predator'])
+
+    def get_event_counts(self):  # totals since the start of the run
+        return dict(self._events)
+
+    def get_profiler(self):
+        return self._profiler
+
+    def _target_cache_pools(self):  # kind -> (agents, targets), a food and a partner cache per species
+        pools = dict()
+        for name, species in self._species.items():
+            if species.diet == 'victim_food':
+                foods = list(self._victim_foods)
+            else:
+                prey = self._species[species.prey]
+                foods = list(self._pools[prey.name]) + [x for x in self._corpses if x.get_species() is prey]
+            pools[f'{name}_food'] = (self._pools[name], foods)
+            pools[f'{name}_partner'] = (self._pools[name], self._pools[name])
+        return pools
+
+    def get_target_cache_stats(self):  # hits and misses per cache, None when the cache is off
+        if self._target_caches is None:
+            return None
+        return {kind: cache.get_stats() for kind, cache in self._target_caches.items()}
+
+    def add_step_listener(self, listener):  # listener(simulation) is called after every step
+        self._step_listeners.append(listener)
+
+    def remove_step_listener(self, listener):
+        self._step_listeners.remove(listener)
+
+    def print_stats(self):
+        print_stats(self)
+
+    def save(self, path):
+        from checkpoint import write_checkpoint, records_to_columns  # checkpoints need numpy
+
+        version, internal_state, gauss_next = self._random.getstate()
+        meta = {
+            'time_line': self._time_line.get_checkpoint(),
+            'events': self._events,
+            'config': self._config.to_dict(),
+            'random_state': [version, internal_state, gauss_next],
+            'wander_state': self._wander.get_state(),
+            'two_phase': self._two_phase,
+            'scheduled': self._scheduler is not None,
+            'tick_number': self._tick_number,
+        }
+        columns = dict()
+        for name, species in self._species.items():  # <name> columns for its agents, <name>_corpse for its corpses
+            pool, fields = self._pools[name], species.agent_class.CHECKPOINT_FIELDS
+            meta[f'{species.kind}_died'] = self._died[name]
+            if 'grid_order' not in fields:  # the pool order is the grid order
+                columns.update(records_to_columns(name, [agent.get_checkpoint() for agent in pool], fields))
+                continue
+            corpses = [corpse for corpse in self._corpses if corpse.get_species() is species]
+            ranks = {body: rank for rank, body in enumerate(sorted(list(pool) + corpses, key=self._body_order))}
+            columns.update(records_to_columns(name, [dict(agent.get_checkpoint(), grid_order=ranks[agent])
+                                                     for agent in pool], fields))
+            columns.update(records_to_columns(f'{name}_corpse', [dict(corpse.get_checkpoint(), grid_order=ranks[corpse])
+                                                                 for corpse in corpses], CORPSE_CHECKPOINT_FIELDS))
+        grid = self._victim_foods_grid
+        ranks = {food: rank for rank, food in enumerate(sorted(grid, key=grid.get_order))}
+        food_records = [dict(f.get_checkpoint(), grid_order=ranks.get(f, -1)) for f in self._victim_foods]
+        columns.update(records_to_columns('victim_food', food_records, VICTIM_FOOD_CHECKPOINT_FIELDS))
+        if self._scheduler is not None:
+            for kind, pool in self._pools.items():
+                records = [{'synced_at': agent.get_synced_at(),
+                            'due': self._now if agent in self._every_tick else self._scheduler.get_due(agent)}
+                           for agent in pool]
+                for record in records:
+                    if record['due'] is None:
+                        record['due'] = float('inf')
+                columns.update(records_to_columns(f'{kind}_schedule', records, SCHEDULE_CHECKPOINT_FIELDS))
+        if self._target_caches is not None:
+            meta['target_caches'] = self.get_target_cache_stats()
+            for kind, (agents, targets) in self._target_cache_pools().items():
+                agent_index = {agent: i for i, agent in enumerate(agents)}
+                target_index = {target: i for i, target in enumerate(targets)}
+                records = list()
+                for agent, entry in self._target_caches[kind].get_entries().items():
+                    target, agent_position, target_position, tick = entry
+                    if target is not None and target not in target_index:
+                        continue  # the target is gone, a lookup would miss anyway
+                    records.append({'agent': agent_index[agent], 'target': target_index.get(target, -1),
+                                    'agent_position': agent_position.as_tuple(),
+                                    'target_position': (target_position or Vec2()).as_tuple(), 'tick': tick})
+                columns.update(records_to_columns(f'target_cache.{kind}', records, TARGET_CACHE_CHECKPOINT_FIELDS))
+        write_checkpoint(path, 'objects', meta, columns)
+
+    @classmethod
+    def load(cls, path):
+        from checkpoint import read_checkpoint, columns_to_records
+
+        meta, columns = read_checkpoint(path, 'objects')
+        config = SimulationConfig.from_dict(meta['config'])
+        simulation = cls(config=config, two_phase=meta.get('two_phase', False), scheduled=meta.get('scheduled', False))
+        version, internal_state, gauss_next = meta['random_state']
+        simulation._random.setstate((version, tuple(internal_state), gauss_next))
+        simulation._wander.set_state(meta['wander_state'])
+        simulation._time_line.restore_checkpoint(meta['time_line'])
+        simulation._now = simulation._previous_now = simulation._time_line.get_time()
+        simulation._events.update(meta['events'])
+        for name, species in simulation._species.items():
+            simulation._died[name] = meta[f'{species.kind}_died']
+            fields, ranked = species.agent_class.CHECKPOINT_FIELDS, list()
+            for values in columns_to_records(name, columns, fields):
+                agent = species.agent_class.from_checkpoint(values, simulation._wander, config)
+                simulation._spawn(agent)
+                ranked.append((values.get('grid_order'), agent))
+            if 'grid_order' not in fields:
+                continue
+            grid = simulation._grids[name]
+            grid.clear()
+            for rank, agent in ranked:
+                grid.insert(agent, rank)
+            for values in columns_to_records(f'{name}_corpse', columns, CORPSE_CHECKPOINT_FIELDS):
+                simulation.add_corpse(Corpse.from_checkpoint(values, species), values['grid_order'])
+        ranked = list()
+        for values in columns_to_records('victim_food', columns, VICTIM_FOOD_CHECKPOINT_FIELDS):
+            food = VictimFood.from_checkpoint(values, config)
+            simulation.add_victim_food(food)
+            if values['grid_order'] >= 0:
+                ranked.append((values['grid_order'], food))
+        simulation._victim_foods_grid.clear()  # regrown patches went back into the grid after the others
+        for rank, food in sorted(ranked, key=lambda x: x[0]):
+            simulation._victim_foods_grid.insert(food)
+        simulation._tick_number = meta.get('tick_number', 0)
+        if simulation._scheduler is not None:
+            simulation._scheduler.clear()
+            for kind, pool in simulation._pools.items():
+                for agent, values in zip(pool, columns_to_records(f'{kind}_schedule', columns, SCHEDULE_CHECKPOINT_FIELDS)):
+                    agent.set_synced_at(values['synced_at'])
+                    if values['due'] != float('inf'):
+                        simulation._scheduler.schedule(agent, values['due'])
+        if simulation._target_caches is not None:
+            for kind, (agents, targets) in simulation._target_cache_pools().items():
+                cache = simulation._target_caches[kind]
+                cache.restore_stats(meta['target_caches'][kind])
+                agents, targets = list(agents), list(targets)
+                for values in columns_to_records(f'target_cache.{kind}', columns, TARGET_CACHE_CHECKPOINT_FIELDS):
+                    target = targets[values['target']] if values['target'] >= 0 else None
+                    cache.restore_entry(agents[values['agent']], target, Vec2(*values['agent_position']),
+                                        Vec2(*values['target_position']) if target is not None else None,
+                                        values['tick'])
+        return simulation
+
+    def _tick(self, sim_dt):
+        profiling = self._profiler.is_enabled()
+        if profiling:
+            self._phase_ns = dict.fromkeys(SIMULATION_PROFILED_PHASES, 0)
+            start = perf_counter_ns()
+        for pool in self._pools.values():  # births and deaths join the pools once the tick is over
+            pool.defer()
+        self._corpses.defer()
+        self._rot_corpses()
+        if self._scheduler is not None:
+            self._advance_schedule()
+        if self._two_phase:
+            self._process_two_phase(sim_dt)
+        else:
+            for species in self._species.values():
+                self._process_species(species, sim_dt)
+                if species.rot_period is not None:  # corpses drift right after the species that leaves them
+                    self._drift_corpses(sim_dt, species)
+            self._visiting = None
+        self._regrow_victim_foods(sim_dt)
+        for pool in self._pools.values():
+            pool.apply()
+        self._corpses.apply()
+        self._tick_number += 1
+        if profiling:
+            self._phase_ns['tick'] = perf_counter_ns() - start
+            for phase, ns in self._phase_ns.items():
+                self._profiler.record(phase, ns)
+            self._profiler.end_tick()
+            self._phase_ns = None
+        for listener in self._step_listeners:
+            listener(self)
+
+    def step(self, sim_dt):  # advances the model by sim_dt simulation milliseconds
+        self._time_line.advance(sim_dt)
+        self._tick(sim_dt)
+
+    def loop(self, dt):  # dt is wall clock time, scaled by SIMULATION_TIME_FACTOR
+        if self._time_line.get_fixed_step() is not None:
+            self._time_line.accumulate(dt, SIMULATION_MAX_STEPS_PER_LOOP)
+            while self._time_line.take_fixed_step():
+                self.step(self._time_line.get_fixed_step())
+            return
+
+        self._time_line.update(dt)
+        self._tick(self._time_line.get_delta_time())
+
+    def clear(self):
+        pass
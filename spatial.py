@@ -0,0 +1,152 @@
+from math import floor
+
+from vecmath import distance_sq
+
+
+SPATIAL_COUNT_LEVELS = 12  # coarse count grids kept for density maps, each with cells twice as wide as the last
+
+
+# Counts of objects per coarse cell are kept up to date as objects enter and leave cells: level k
+# counts the cells 2^k cells wide, so a density map of any scale reads one level and visits no
+# more cells than it shows, however many objects or occupied cells the grid holds
+class SpatialGrid:
+
+    def __init__(self, cell_size):
+        self._cell_size = cell_size
+        self._cells = dict()
+        self._entries = dict()  # obj -> (cell, order)
+        self._next_order = 0
+        self._level_counts = [dict() for level in range(SPATIAL_COUNT_LEVELS)]  # level -> coarse cell -> objects
+
+    def get_cell_size(self):
+        return self._cell_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, obj):
+        return obj in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def get_order(self, obj):  # rank of the insertion, query results come in this order
+        return self._entries[obj][1]
+
+    def _cell_of(self, pos):
+        return floor(pos.get_x() / self._cell_size), floor(pos.get_y() / self._cell_size)
+
+    def insert(self, obj, order=None):  # an explicit order places obj among objects of another grid
+        cell = self._cell_of(obj.get_position())
+        if order is None:
+            order = self._next_order
+        self._next_order = max(self._next_order, order + 1)
+        self._entries[obj] = (cell, order)
+        self._cells.setdefault(cell, dict())[obj] = order
+        self._count(cell, None)
+
+    def remove(self, obj):
+        cell, order = self._entries.pop(obj)
+        bucket = self._cells[cell]
+        del bucket[obj]
+        if not bucket:
+            del self._cells[cell]
+        self._count(None, cell)
+
+    def _count(self, cell, old_cell):  # moves one object between coarse cells, either cell may be None
+        for level, counts in enumerate(self._level_counts):
+            coarse = (cell[0] >> level, cell[1] >> level) if cell is not None else None
+            old_coarse = (old_cell[0] >> level, old_cell[1] >> level) if old_cell is not None else None
+            if coarse == old_coarse:  # then also on every coarser level
+                return
+            if coarse is not None:
+                counts[coarse] = counts.get(coarse, 0) + 1
+            if old_coarse is not None:
+                if counts[old_coarse] == 1:
+                    del counts[old_coarse]
+                else:
+                    counts[old_coarse] -= 1
+
+    def update(self, obj):  # should be called after obj has moved
+        old_cell, order = self._entries[obj]
+        cell = self._cell_of(obj.get_position())
+        if cell == old_cell:
+            return
+        bucket = self._cells[old_cell]
+        del bucket[obj]
+        if not bucket:
+            del self._cells[old_cell]
+        self._entries[obj] = (cell, order)
+        self._cells.setdefault(cell, dict())[obj] = order
+        self._count(cell, old_cell)
+
+    def clear(self):
+        self._cells.clear()
+        self._entries.clear()
+        self._next_order = 0
+        for counts in self._level_counts:
+            counts.clear()
+
+    # Objects within radius of pos, in insertion order, so that callers picking
+    # the first of equally distant objects behave exactly like a linear scan
+    def query_radius(self, pos, radius):
+        # a small margin keeps float rounding in length() from hiding border objects
+        reach = radius * (1 + 1e-9) + 1e-9
+        x, y = pos.get_x(), pos.get_y()
+        radius_sq = radius * radius
+        min_cx, min_cy = floor((x - reach) / self._cell_size), floor((y - reach) / self._cell_size)
+        max_cx, max_cy = floor((x + reach) / self._cell_size), floor((y + reach) / self._cell_size)
+        found = list()
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = self._cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for obj, order in bucket.items():
+                    if distance_sq(obj.get_position(), pos) <= radius_sq:
+                        found.append((order, obj))
+        found.sort(key=lambda x: x[0])
+        return [obj for order, obj in found]
+
+    def _cell_range(self, x0, y0, x1, y1):
+        return (floor(x0 / self._cell_size), floor(y0 / self._cell_size),
+                floor(x1 / self._cell_size), floor(y1 / self._cell_size))
+
+    def query_rect(self, x0, y0, x1, y1):  # objects with x0 <= x <= x1 and y0 <= y <= y1, in no particular order
+        min_cx, min_cy, max_cx, max_cy = self._cell_range(x0, y0, x1, y1)
+        found = list()
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(self._cells):  # fewer occupied cells than covered ones
+            cells = [(cell, bucket) for cell, bucket in self._cells.items()
+                     if min_cx <= cell[0] <= max_cx and min_cy <= cell[1] <= max_cy]
+        else:
+            cells = [((cx, cy), self._cells.get((cx, cy))) for cx in range(min_cx, max_cx + 1)
+                     for cy in range(min_cy, max_cy + 1)]
+        for (cx, cy), bucket in cells:
+            if not bucket:
+                continue
+            if min_cx < cx < max_cx and min_cy < cy < max_cy:  # inner cells lie wholly inside the rect
+                found.extend(bucket)
+                continue
+            for obj in bucket:
+                x, y = obj.get_position().as_tuple()
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    found.append(obj)
+        return found
+
+    # Cell size and (cell x, cell y, objects) of the occupied cells meeting the rect, for cells at least
+    # min_cell_size wide where the coarsest level allows. Visits the covered or the occupied cells of
+    # the level, whichever are fewer
+    def get_cell_counts(self, x0, y0, x1, y1, min_cell_size=0):
+        level = 0
+        while level < SPATIAL_COUNT_LEVELS - 1 and self._cell_size * (1 << level) < min_cell_size:
+            level += 1
+        size = self._cell_size * (1 << level)
+        counts = self._level_counts[level]
+        min_cx, min_cy, max_cx, max_cy = floor(x0 / size), floor(y0 / size), floor(x1 / size), floor(y1 / size)
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(counts):
+            cells = [(cx, cy, number) for (cx, cy), number in counts.items()
+                     if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy]
+        else:
+            cells = [(cx, cy, counts[cx, cy]) for cx in range(min_cx, max_cx + 1) for cy in range(min_cy, max_cy + 1)
+                     if (cx, cy) in counts]
+        return size, cells
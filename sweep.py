@@ -0,0 +1,119 @@
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from headless import create_simulation, HEADLESS_DEFAULT_SIM_DT
+from simulation import SimulationConfig, SIMULATION_DEFAULT_CONFIG
+
+
+SWEEP_DEFAULT_STEPS = 10000
+SWEEP_DEFAULT_SAMPLE_EVERY = 100  # steps
+SWEEP_SERIES_COLUMNS = ('step', 'time', 'victims', 'predators', 'victims_died', 'predators_died')
+
+
+def grid_configs(grid, base=SIMULATION_DEFAULT_CONFIG):  # grid maps config field names to lists of values
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dataclasses.replace(base, **dict(zip(names, values)))
+
+
+def parse_value(name, text):
+    types = {field.name: field.type for field in dataclasses.fields(SimulationConfig)}
+    if name not in types:
+        raise ValueError(f'Unknown config field: {name}')
+    if types[name] is tuple:  # world_size, whole units as in main.py, for randint
+        return tuple(round(float(x)) for x in text.split('x'))
+    if types[name] is bool:
+        return text.lower() in ('1', 'true', 'yes')
+    return types[name](text)
+
+
+def _sample(simulation, step):
+    return (step, simulation.get_time(), simulation.get_victims_number(), simulation.get_predators_number(),
+            simulation.get_victims_died(), simulation.get_predators_died())
+
+
+def run_series(config, seed, steps, sim_dt, sample_every, backend):
+    simulation = create_simulation(backend, seed, config)
+    simulation.setup()
+    series = [_sample(simulation, 0)]
+    for step in range(1, steps + 1):
+        simulation.step(sim_dt)
+        if step % sample_every == 0 or step == steps:
+            series.append(_sample(simulation, step))
+    return series
+
+
+def varying_fields(configs):
+    return [field.name for field in dataclasses.fields(SimulationConfig)
+            if len({getattr(config, field.name) for config in configs}) > 1]
+
+
+def sweep(configs, seeds, steps=SWEEP_DEFAULT_STEPS, sim_dt=HEADLESS_DEFAULT_SIM_DT,
+          sample_every=SWEEP_DEFAULT_SAMPLE_EVERY, backend='objects', workers=None):
+    configs = list(configs)
+    params = varying_fields(configs)
+    runs = list(itertools.product(range(len(configs)), seeds))
+    columns = ('run', 'config', 'seed', *params, *SWEEP_SERIES_COLUMNS)
+    rows = list()
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(run_series, configs[i], seed, steps, sim_dt, sample_every, backend)
+                   for i, seed in runs]
+        for run, ((i, seed), future) in enumerate(zip(runs, futures)):
+            values = tuple(getattr(configs[i], name) for name in params)
+            for sample in future.result():
+                rows.append((run, i, seed, *values, *sample))
+    return columns, rows
+
+
+def write_table(path, columns, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run headless simulations for a grid of configs and seeds.')
+    parser.add_argument('--set', action='append', default=list(), metavar='FIELD=V1,V2,...',
+                        help='sweep a SimulationConfig field over the given values, world_size as WxH')
+    parser.add_argument('--configs', metavar='JSON',
+                        help='file with a list of SimulationConfig overrides, used instead of --set')
+    parser.add_argument('--seeds', type=int, default=1, help='run seeds 0..SEEDS-1 for every config')
+    parser.add_argument('-n', '--steps', type=int, default=SWEEP_DEFAULT_STEPS)
+    parser.add_argument('--sim-dt', type=float, default=HEADLESS_DEFAULT_SIM_DT,
+                        help='simulation milliseconds per step')
+    parser.add_argument('--sample-every', type=int, default=SWEEP_DEFAULT_SAMPLE_EVERY, help='steps between samples')
+    parser.add_argument('--backend', choices=('objects', 'numpy'), default='objects')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-o', '--output', default='sweep.csv')
+    args = parser.parse_args()
+
+    if args.configs:
+        with open(args.configs) as f:
+            configs = [dataclasses.replace(SIMULATION_DEFAULT_CONFIG,
+                                           **{name: tuple(value) if isinstance(value, list) else value
+                                              for name, value in overrides.items()})
+                       for overrides in json.load(f)]
+    else:
+        grid = dict()
+        for item in args.set:
+            name, values = item.split('=', 1)
+            grid[name] = [parse_value(name, value) for value in values.split(',')]
+        configs = list(grid_configs(grid))
+
+    start = time.perf_counter()
+    columns, rows = sweep(configs, range(args.seeds), args.steps, args.sim_dt, args.sample_every,
+                          args.backend, args.workers)
+    write_table(args.output, columns, rows)
+    print(f'{len(configs) * args.seeds} runs, {len(rows)} rows written to {args.output} '
+          f'in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
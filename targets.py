@@ -0,0 +1,54 @@
+from vecmath import distance_sq
+
+
+# Remembers the target each agent found on its last search (None when it found nothing), together
+# with where the agent and the target were at that time. A remembered target is reused until the
+# agent or the target has moved more than move_threshold, it is no longer valid, or interval ticks
+# have passed since the search. is_valid(target) tells whether a remembered target can still be chosen
+class TargetCache:
+
+    def __init__(self, move_threshold, interval):
+        self._move_threshold_sq = move_threshold * move_threshold
+        self._interval = interval
+        self._entries = dict()  # agent -> (target, agent position, target position, tick)
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, agent, tick, is_valid):  # returns (True, target) on a hit, (False, None) when a search is needed
+        entry = self._entries.get(agent)
+        if entry is not None:
+            target, agent_position, target_position, searched = entry
+            if (tick - searched < self._interval
+                    and distance_sq(agent.get_position(), agent_position) <= self._move_threshold_sq
+                    and (target is None
+                         or distance_sq(target.get_position(), target_position) <= self._move_threshold_sq
+                         and is_valid(target))):
+                self._hits += 1
+                return True, target
+        self._misses += 1
+        return False, None
+
+    def store(self, agent, target, tick):
+        self._entries[agent] = (target, agent.get_position(), target.get_position() if target is not None else None, tick)
+
+    def restore_entry(self, agent, target, agent_position, target_position, tick):  # for checkpoints
+        self._entries[agent] = (target, agent_position, target_position, tick)
+
+    def discard(self, agent):
+        self._entries.pop(agent, None)
+
+    def get_entries(self):
+        return self._entries
+
+    def get_stats(self):
+        return {'hits': self._hits, 'misses': self._misses}
+
+    def restore_stats(self, stats):
+        self._hits = stats['hits']
+        self._misses = stats['misses']
+
+    def clear(self):
+        self._entries.clear()
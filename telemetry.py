@@ -0,0 +1,93 @@
+import csv
+import queue
+import threading
+
+from simulation import PREDATOR_STATE_NAMES, SIMULATION_EVENTS, SIMULATION_SECOND, VICTIM_STATE_NAMES
+
+
+TELEMETRY_DEFAULT_PERIOD = 10 * SIMULATION_SECOND  # sim milliseconds between records
+TELEMETRY_CHUNK_SIZE = 256  # records buffered before they are handed to the writer thread
+
+TELEMETRY_COLUMNS = ('time', 'victims', 'predators', 'food_available', 'food_mass',
+                     *(f'victims_{name}' for name in VICTIM_STATE_NAMES),
+                     *(f'predators_{name}' for name in PREDATOR_STATE_NAMES),
+                     *SIMULATION_EVENTS)
+
+
+class TelemetryWriter:
+
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+        self._chunks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            self._writer.writerows(zip(*chunk))
+            self._file.flush()
+        self._file.close()
+
+    def write_chunk(self, chunk):  # chunk is a list of columns of equal length
+        self._chunks.put(chunk)
+
+    def close(self):
+        self._chunks.put(None)
+        self._thread.join()
+
+
+# Samples the simulation counters every period sim milliseconds. Populations per state are
+# taken as they are at the sample, events are counted over the interval since the last record
+class Telemetry:
+
+    def __init__(self, path, period=TELEMETRY_DEFAULT_PERIOD, chunk_size=TELEMETRY_CHUNK_SIZE):
+        self._period = period
+        self._chunk_size = chunk_size
+        self._writer = TelemetryWriter(path, TELEMETRY_COLUMNS)
+        self._chunk = [list() for column in TELEMETRY_COLUMNS]
+        self._next_time = None
+        self._last_events = None
+        self._simulation = None
+
+    def attach(self, simulation):
+        self._simulation = simulation
+        self._last_events = simulation.get_event_counts()
+        self._next_time = simulation.get_time()
+        self.on_step(simulation)
+        simulation.add_step_listener(self.on_step)
+
+    def on_step(self, simulation):
+        if simulation.get_time() < self._next_time:
+            return
+        while self._next_time <= simulation.get_time():
+            self._next_time += self._period
+        self._record(simulation)
+
+    def _record(self, simulation):
+        events = simulation.get_event_counts()
+        record = (simulation.get_time(), simulation.get_victims_number(), simulation.get_predators_number(),
+                  simulation.get_victim_foods_available(), simulation.get_victim_food_mass(),
+                  *simulation.get_victim_state_counts(), *simulation.get_predator_state_counts(),
+                  *(events[name] - self._last_events[name] for name in SIMULATION_EVENTS))
+        self._last_events = events
+        for column, value in zip(self._chunk, record):
+            column.append(value)
+        if len(self._chunk[0]) >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunk[0]:
+            self._writer.write_chunk(self._chunk)
+            self._chunk = [list() for column in TELEMETRY_COLUMNS]
+
+    def close(self):
+        if self._simulation is not None:
+            self._simulation.remove_step_listener(self.on_step)
+            self._simulation = None
+        self.flush()
+        self._writer.close()
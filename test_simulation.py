@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from checkpoint import read_checkpoint
+from simulation import Simulation
+from trajectory import TRAJECTORY_POSITION_SCALE, TrajectoryReader, TrajectoryRecorder
+from vectorized import VectorSimulation
+
+
+STEP_DT = 2000.0
+SCHEDULED_STEP_DT = 416.6666666666667
+SCHEDULED_TOLERANCE = 1e-6  # how far scheduled positions may drift from polling ones, in world units
+
+
+def run(simulation, steps, sim_dt=STEP_DT):
+    for _ in range(steps):
+        simulation.step(sim_dt)
+    return simulation
+
+
+def saved_state(simulation, path, backend):  # (meta, columns) of a checkpoint of simulation
+    simulation.save(path)
+    return read_checkpoint(path, backend)
+
+
+def assert_same_state(first, second):
+    meta, columns = first
+    other_meta, other_columns = second
+    assert meta == other_meta
+    assert columns.keys() == other_columns.keys()
+    for name, column in columns.items():
+        np.testing.assert_array_equal(column, other_columns[name], err_msg=name)
+
+
+@pytest.mark.parametrize('options', [dict(), dict(two_phase=True), dict(scheduled=True)],
+                         ids=['plain', 'two_phase', 'scheduled'])
+def test_objects_resume_matches_continuous_run(tmp_path, options):
+    simulation = Simulation(7, **options)
+    simulation.setup()
+    run(simulation, 150)
+    simulation.save(tmp_path / 'resume.npz')
+    resumed = Simulation.load(tmp_path / 'resume.npz')
+    run(simulation, 150)
+    run(resumed, 150)
+    assert_same_state(saved_state(simulation, tmp_path / 'a.npz', 'objects'),
+                      saved_state(resumed, tmp_path / 'b.npz', 'objects'))
+
+
+def test_numpy_resume_matches_continuous_run(tmp_path):
+    simulation = VectorSimulation(7)
+    simulation.setup()
+    run(simulation, 150)
+    simulation.save(tmp_path / 'resume.npz')
+    resumed = VectorSimulation.load(tmp_path / 'resume.npz')
+    run(simulation, 150)
+    run(resumed, 150)
+    assert_same_state(saved_state(simulation, tmp_path / 'a.npz', 'numpy'),
+                      saved_state(resumed, tmp_path / 'b.npz', 'numpy'))
+
+
+@pytest.mark.parametrize('seed', [1, 3])
+def test_scheduled_matches_polling(seed):
+    polling = Simulation(seed)
+    scheduled = Simulation(seed, scheduled=True)
+    polling.setup()
+    scheduled.setup()
+    for tick in range(500):
+        polling.step(SCHEDULED_STEP_DT)
+        scheduled.step(SCHEDULED_STEP_DT)
+        for getter in ('get_victims', 'get_predators'):
+            agents = list(getattr(polling, getter)())
+            others = list(getattr(scheduled, getter)())
+            assert [agent.get_state() for agent in agents] == [other.get_state() for other in others], tick
+            for agent, other in zip(agents, others):
+                assert (agent.get_position() - other.get_position()).length() <= SCHEDULED_TOLERANCE, tick
+    assert polling.get_victims_died() == scheduled.get_victims_died()
+    assert polling.get_predators_died() == scheduled.get_predators_died()
+
+
+def capture(simulation):  # kind -> sorted (x, y, state) as a recorder stores them for a tick
+    scale = TRAJECTORY_POSITION_SCALE
+    entities = dict()
+    for kind, getter in (('victims', 'get_victims'), ('predators', 'get_predators'),
+                         ('corpses', 'get_corpses'), ('victim_foods', 'get_victim_foods')):
+        records = list()
+        for entity in getattr(simulation, getter)():
+            x, y = entity.get_position().as_tuple()
+            state = int(entity.is_available()) if kind == 'victim_foods' else entity.get_state()
+            records.append((round(x * scale) / scale, round(y * scale) / scale, state))
+        entities[kind] = sorted(records)
+    return entities
+
+
+def test_trajectory_seek_matches_recorded_ticks(tmp_path):
+    simulation = Simulation(3)
+    simulation.setup()
+    recorder = TrajectoryRecorder(tmp_path / 'run.traj', chunk_ticks=64)
+    recorder.attach(simulation)
+    ticks = [capture(simulation)]
+    for _ in range(200):
+        simulation.step(STEP_DT)
+        ticks.append(capture(simulation))
+    recorder.close()
+
+    reader = TrajectoryReader(tmp_path / 'run.traj')
+    try:
+        assert len(reader) == len(ticks)
+        for tick in list(range(0, len(ticks), 7)) + [150, 3, 199, 128, 127, 64, 0]:  # forward, back, across chunks
+            frame = reader.seek_tick(tick)
+            for kind, getter in (('victims', 'get_victims'), ('predators', 'get_predators'),
+                                 ('corpses', 'get_corpses'), ('victim_foods', 'get_victim_foods')):
+                recorded = sorted((*entity.get_position().as_tuple(), entity.get_state())
+                                  for entity in getattr(frame, getter)())
+                assert recorded == ticks[tick][kind], (tick, kind)
+    finally:
+        reader.close()
@@ -0,0 +1,387 @@
+import json
+import mmap
+import queue
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+
+import numpy as np
+
+from profiling import Profiler
+from spatial import SPATIAL_COUNT_LEVELS
+from vecmath import Vec2
+
+
+TRAJECTORY_MAGIC = b'SIMTRAJ\0'
+TRAJECTORY_VERSION = 1
+TRAJECTORY_CHUNK_TICKS = 256  # ticks per chunk, a seek decodes at most this many
+TRAJECTORY_POSITION_SCALE = 64  # fixed point steps per world unit
+TRAJECTORY_COMPRESSION_LEVEL = 3
+TRAJECTORY_KINDS = ('victims', 'predators', 'corpses', 'victim_foods')  # kind number -> name
+
+_HEADER = struct.Struct('<8sI')  # magic, length of the JSON meta that follows
+_CHUNK_HEADER = struct.Struct('<IIdd')  # compressed payload length, ticks, time of the first and last tick
+
+
+# File layout: a header with the JSON meta, then chunks appended as they fill up, each a fixed
+# header and a zlib-compressed payload of columns. The first tick of a chunk holds every entity,
+# the following ones only the entities that moved or changed state, as position deltas, and the
+# ids that left. Decoding a chunk therefore never needs an earlier one. A chunk that was cut off
+# (a recording that crashed) is ignored when reading
+def _encode_chunk(times, records, removed):
+    counts = np.array([len(tick) for tick in records], dtype=np.uint32)
+    removed_counts = np.array([len(tick) for tick in removed], dtype=np.uint32)
+    rows = np.array([record for tick in records for record in tick], dtype=np.int64).reshape(-1, 5)
+    columns = (np.array(times, dtype=np.float64), counts, removed_counts,
+               rows[:, 0].astype(np.uint32), rows[:, 1].astype(np.uint8), rows[:, 2].astype(np.uint8),
+               rows[:, 3].astype(np.int32), rows[:, 4].astype(np.int32),
+               np.array([entity_id for tick in removed for entity_id in tick], dtype=np.uint32))
+    payload = zlib.compress(b''.join(column.tobytes() for column in columns), TRAJECTORY_COMPRESSION_LEVEL)
+    return _CHUNK_HEADER.pack(len(payload), len(times), times[0], times[-1]) + payload
+
+
+def _decode_chunk(payload, ticks):
+    data = zlib.decompress(payload)
+    columns = dict()
+    offset = 0
+    for name, dtype, count in (('times', np.float64, ticks), ('counts', np.uint32, ticks),
+                               ('removed_counts', np.uint32, ticks)):
+        columns[name] = np.frombuffer(data, dtype, count, offset)
+        offset += columns[name].nbytes
+    records = int(columns['counts'].sum())
+    for name, dtype in (('ids', np.uint32), ('kinds', np.uint8), ('states', np.uint8), ('dx', np.int32),
+                        ('dy', np.int32)):
+        columns[name] = np.frombuffer(data, dtype, records, offset)
+        offset += columns[name].nbytes
+    columns['removed'] = np.frombuffer(data, np.uint32, int(columns['removed_counts'].sum()), offset)
+    columns['starts'] = np.concatenate(([0], np.cumsum(columns['counts'], dtype=np.int64)))
+    columns['removed_starts'] = np.concatenate(([0], np.cumsum(columns['removed_counts'], dtype=np.int64)))
+    _index_chunk(columns)
+    return columns
+
+
+# Every entity of a chunk has a record in it, at its first tick or when it appears, and keeps its
+# kind, so the entities of a chunk get slots of their own grouped by kind: ids are mapped to slots
+# once per chunk, the state arrays hold only the entities of the chunk, and the entities of a kind
+# are a range of slots. Ids that left are entities of the chunk too, they left after a record
+def _index_chunk(columns):
+    ids, first = np.unique(columns['ids'], return_index=True)
+    kinds = columns['kinds'][first]
+    order = np.lexsort((ids, kinds))  # the slots, by kind and then id
+    slot_of = np.empty(len(ids), dtype=np.int64)  # position in ids -> slot
+    slot_of[order] = np.arange(len(ids))
+    columns['slots'] = slot_of[np.searchsorted(ids, columns['ids'])]
+    columns['removed_slots'] = slot_of[np.searchsorted(ids, columns['removed'])]
+    columns['kind_starts'] = np.searchsorted(kinds[order], np.arange(len(TRAJECTORY_KINDS) + 1))
+
+
+class TrajectoryWriter:  # encodes and appends chunks on a thread of its own, like TelemetryWriter
+
+    def __init__(self, path, meta):
+        self._file = open(path, 'wb')
+        meta = json.dumps(dict(meta, version=TRAJECTORY_VERSION)).encode()
+        self._file.write(_HEADER.pack(TRAJECTORY_MAGIC, len(meta)) + meta)
+        self._chunks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            self._file.write(_encode_chunk(*chunk))
+            self._file.flush()
+        self._file.close()
+
+    def write_chunk(self, times, records, removed):
+        self._chunks.put((times, records, removed))
+
+    def close(self):
+        self._chunks.put(None)
+        self._thread.join()
+
+
+# Records the positions and states of all entities of an object model simulation after every
+# tick. Entities get ids of their own on first sight, which are never reused, so an id names one
+# victim, predator, body or food patch for the whole recording
+class TrajectoryRecorder:
+
+    def __init__(self, path, chunk_ticks=TRAJECTORY_CHUNK_TICKS):
+        self._path = path
+        self._chunk_ticks = chunk_ticks
+        self._writer = None
+        self._simulation = None
+        self._ids = dict()  # entity -> id, only for entities present at the last tick
+        self._next_id = 0
+        self._previous = dict()  # id -> (kind, state, x, y) as decoded at the last tick
+        self._times, self._records, self._removed = list(), list(), list()
+
+    def attach(self, simulation):
+        self._simulation = simulation
+        config = simulation.get_config()
+        self._writer = TrajectoryWriter(self._path, {'config': config.to_dict(), 'kinds': TRAJECTORY_KINDS,
+                                                     'position_scale': TRAJECTORY_POSITION_SCALE,
+                                                     'chunk_ticks': self._chunk_ticks})
+        self.on_step(simulation)
+        simulation.add_step_listener(self.on_step)
+
+    def _capture(self, simulation):  # id -> (kind, state, x, y) with positions in fixed point
+        ids = dict()
+        current = dict()
+        scale = TRAJECTORY_POSITION_SCALE
+        for kind, entities in enumerate((simulation.get_victims(), simulation.get_predators(),
+                                         simulation.get_corpses(), simulation.get_victim_foods())):
+            foods = TRAJECTORY_KINDS[kind] == 'victim_foods'
+            for entity in entities:
+                entity_id = self._ids.get(entity)
+                if entity_id is None:
+                    entity_id = self._next_id
+                    self._next_id += 1
+                ids[entity] = entity_id
+                x, y = entity.get_position().as_tuple()
+                state = int(entity.is_available()) if foods else entity.get_state()
+                current[entity_id] = (kind, state, round(x * scale), round(y * scale))
+        self._ids = ids
+        return current
+
+    def on_step(self, simulation):
+        current = self._capture(simulation)
+        if not self._times:  # a chunk starts with every entity, as a delta from the origin
+            records = [(entity_id, kind, state, x, y) for entity_id, (kind, state, x, y) in current.items()]
+            removed = list()
+        else:
+            previous = self._previous
+            records = list()
+            for entity_id, entry in current.items():
+                last = previous.get(entity_id)
+                if last != entry:
+                    kind, state, x, y = entry
+                    if last is not None:
+                        x, y = x - last[2], y - last[3]
+                    records.append((entity_id, kind, state, x, y))
+            removed = [entity_id for entity_id in previous if entity_id not in current]
+        self._previous = current
+        self._times.append(simulation.get_time())
+        self._records.append(records)
+        self._removed.append(removed)
+        if len(self._times) >= self._chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        if self._times:
+            self._writer.write_chunk(self._times, self._records, self._removed)
+            self._times, self._records, self._removed = list(), list(), list()
+
+    def close(self):
+        if self._simulation is not None:
+            self._simulation.remove_step_listener(self.on_step)
+            self._simulation = None
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+
+class RecordedEntity:
+
+    __slots__ = ('_position', '_state')
+
+    def __init__(self, position, state):
+        self._position = position
+        self._state = state
+
+    def get_position(self):
+        return self._position
+
+    def get_state(self):
+        return self._state
+
+    def is_available(self):  # for food patches, whose state is their availability
+        return self._state != 0
+
+
+# One recorded tick, with the getters the renderer needs from a simulation. Entities are kept as
+# arrays of positions and states per kind, which get_positions hands over as they are: the entity
+# getters build an object per entity and are there for callers that need a simulation's interface
+class TrajectoryFrame:
+
+    def __init__(self, time, entities, cell_sizes, profiler):
+        self._time = time
+        self._entities = entities  # kind name -> (positions, states)
+        self._cell_sizes = cell_sizes  # kind name -> heatmap cell size
+        self._profiler = profiler  # the reader's, a frame has nothing to profile of its own
+
+    def get_positions(self, kind, rect=None):  # (positions, states) arrays of a kind, those inside rect if given
+        positions, states = self._entities[kind]
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            inside = ((positions[:, 0] >= x0) & (positions[:, 0] <= x1)
+                      & (positions[:, 1] >= y0) & (positions[:, 1] <= y1))
+            positions, states = positions[inside], states[inside]
+        return positions, states
+
+    def _get(self, kind, rect=None):
+        positions, states = self.get_positions(kind, rect)
+        return [RecordedEntity(Vec2(x, y), state) for (x, y), state in zip(positions.tolist(), states.tolist())]
+
+    def get_time(self):
+        return self._time
+
+    def get_profiler(self):
+        return self._profiler
+
+    def get_victims(self):
+        return self._get('victims')
+
+    def get_predators(self):
+        return self._get('predators')
+
+    def get_corpses(self):
+        return self._get('corpses')
+
+    def get_victim_foods(self):
+        return self._get('victim_foods')
+
+    def get_victims_in_rect(self, rect):
+        return self._get('victims', rect)
+
+    def get_predators_in_rect(self, rect):
+        return self._get('predators', rect)
+
+    def get_corpses_in_rect(self, rect):
+        return self._get('corpses', rect)
+
+    def get_victim_foods_in_rect(self, rect):
+        return self._get('victim_foods', rect)
+
+    def get_cell_counts(self, rect, min_cell_size=0):  # as Simulation.get_cell_counts
+        counts = dict()
+        for kind, size in self._cell_sizes.items():
+            for level in range(SPATIAL_COUNT_LEVELS - 1):  # the cell sizes of the grid levels
+                if size >= min_cell_size:
+                    break
+                size *= 2
+            cells = np.floor(self._entities[kind][0] / size).astype(np.int64)
+            x0, y0, x1, y1 = (int(value // size) for value in rect)
+            cells = cells[(cells[:, 0] >= x0) & (cells[:, 0] <= x1) & (cells[:, 1] >= y0) & (cells[:, 1] <= y1)]
+            cells, numbers = np.unique(cells, axis=0, return_counts=True)
+            counts[kind] = (size, [(cx, cy, n) for (cx, cy), n in zip(cells.tolist(), numbers.tolist())])
+        return counts
+
+
+# Reads a recording through a memory map. Only the chunk index is built up front; seeking decodes
+# the chunk holding the tick and applies its deltas from the chunk start, or from the current tick
+# when moving forward within the same chunk, so playing forward costs one tick of deltas per tick
+class TrajectoryReader:
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_length = _HEADER.unpack_from(self._map, 0)
+        if magic != TRAJECTORY_MAGIC:
+            raise ValueError(f'Not a trajectory recording: {path}')
+        self._meta = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+        if self._meta.get('version') != TRAJECTORY_VERSION:
+            raise ValueError(f'Unsupported trajectory version: {self._meta.get("version")}')
+        config = self._meta['config']
+        self._cell_sizes = {'victims': config['victim_view_radius'], 'victim_foods': config['victim_view_radius'],
+                            'predators': config['predator_view_radius'], 'corpses': config['predator_view_radius']}
+        self._offsets, self._lengths, self._first_ticks = list(), list(), list()
+        self._first_times, self._last_times = list(), list()
+        offset, ticks = _HEADER.size + meta_length, 0
+        while offset + _CHUNK_HEADER.size <= len(self._map):
+            length, chunk_ticks, first_time, last_time = _CHUNK_HEADER.unpack_from(self._map, offset)
+            if offset + _CHUNK_HEADER.size + length > len(self._map):
+                break
+            self._offsets.append(offset + _CHUNK_HEADER.size)
+            self._lengths.append(length)
+            self._first_ticks.append(ticks)
+            self._first_times.append(first_time)
+            self._last_times.append(last_time)
+            offset += _CHUNK_HEADER.size + length
+            ticks += chunk_ticks
+        if not self._offsets:
+            raise ValueError(f'No complete chunk in {path}')
+        self._ticks = ticks
+        self._chunk_index = None
+        self._chunk = None
+        self._tick = None  # tick within the chunk the state arrays hold
+        self._states = None  # by slot of the loaded chunk, see _index_chunk
+        self._positions = None
+        self._present = None
+        self._profiler = Profiler()
+
+    def __len__(self):
+        return self._ticks
+
+    def get_meta(self):
+        return self._meta
+
+    def get_world_size(self):
+        return tuple(self._meta['config']['world_size'])
+
+    def get_start_time(self):
+        return self._first_times[0]
+
+    def get_end_time(self):
+        return self._last_times[-1]
+
+    def _load_chunk(self, index):
+        if index != self._chunk_index:
+            offset = self._offsets[index]
+            ticks = (self._first_ticks[index + 1] if index + 1 < len(self._offsets) else self._ticks)
+            self._chunk = _decode_chunk(self._map[offset:offset + self._lengths[index]],
+                                        ticks - self._first_ticks[index])
+            self._chunk_index = index
+            self._tick = None
+            slots = self._chunk['kind_starts'][-1]
+            self._states = np.zeros(slots, dtype=np.uint8)
+            self._positions = np.zeros((slots, 2), dtype=np.int64)
+            self._present = np.zeros(slots, dtype=bool)
+
+    def _apply(self, tick):  # the deltas of one tick of the loaded chunk
+        chunk = self._chunk
+        start, end = chunk['starts'][tick], chunk['starts'][tick + 1]
+        slots = chunk['slots'][start:end]
+        if tick == 0:
+            self._present[:] = False
+            self._positions[:] = 0
+        self._present[slots] = True
+        self._states[slots] = chunk['states'][start:end]
+        self._positions[slots, 0] += chunk['dx'][start:end]
+        self._positions[slots, 1] += chunk['dy'][start:end]
+        self._present[chunk['removed_slots'][chunk['removed_starts'][tick]:chunk['removed_starts'][tick + 1]]] = False
+
+    def seek_tick(self, tick):  # frame of the tick-th recorded tick
+        tick = min(max(tick, 0), self._ticks - 1)
+        index = bisect_right(self._first_ticks, tick) - 1
+        self._load_chunk(index)
+        local = tick - self._first_ticks[index]
+        first = 0 if self._tick is None or self._tick > local else self._tick + 1
+        for i in range(first, local + 1):
+            self._apply(i)
+        self._tick = local
+        return self._frame()
+
+    def seek(self, time):  # frame of the last tick at or before time, or the first one
+        index = max(bisect_right(self._first_times, time) - 1, 0)
+        self._load_chunk(index)
+        local = max(int(np.searchsorted(self._chunk['times'], time, 'right')) - 1, 0)
+        return self.seek_tick(self._first_ticks[index] + local)
+
+    def _frame(self):
+        scale = self._meta['position_scale']
+        starts = self._chunk['kind_starts']
+        entities = dict()
+        for kind, name in enumerate(self._meta['kinds']):
+            kind_slots = slice(starts[kind], starts[kind + 1])
+            present = self._present[kind_slots]
+            entities[name] = (self._positions[kind_slots][present] / scale, self._states[kind_slots][present])
+        return TrajectoryFrame(float(self._chunk['times'][self._tick]), entities, self._cell_sizes, self._profiler)
+
+    def close(self):
+        self._chunk = None
+        self._map.close()
+        self._file.close()
@@ -1,7 +1,13 @@
 import math
 
+
+# An immutable value: operators always return new vectors, so a Vec2 shared between objects never
+# changes under them, and equal vectors hash alike, so it can be a dict key or a set member. Hot
+# loops that would allocate on every term accumulate in local floats instead
 class Vec2:
 
+    __slots__ = ('_x', '_y')
+
     def __init__(self, x=0.0, y=0.0):
         self._x = x
         self._y = y
@@ -19,34 +25,30 @@ class Vec2:
         return self._x, self._y
 
     def __iter__(self):
-        return iter(self.as_tuple())
+        return iter((self._x, self._y))
 
     def __add__(self, other):
-        if type(other) == Vec2:
-            return Vec2(self._x + other.get_x(), self._y + other.get_y())
-        else:
-            return Vec2(self._x + other, self._y + other)
+        if type(other) is Vec2:
+            return Vec2(self._x + other._x, self._y + other._y)
+        return Vec2(self._x + other, self._y + other)
 
     def __sub__(self, other):
-        if type(other) == Vec2:
-            return Vec2(self._x - other.get_x(), self._y - other.get_y())
-        else:
-            return Vec2(self._x - other, self._y - other)
+        if type(other) is Vec2:
+            return Vec2(self._x - other._x, self._y - other._y)
+        return Vec2(self._x - other, self._y - other)
 
     def __mul__(self, other):
-        if type(other) == Vec2:
-            return Vec2(self._x * other.get_x(), self._y * other.get_y())
-        else:
-            return Vec2(self._x * other, self._y * other)
+        if type(other) is Vec2:
+            return Vec2(self._x * other._x, self._y * other._y)
+        return Vec2(self._x * other, self._y * other)
 
     def __truediv__(self, other):
-        if type(other) == Vec2:
-            return Vec2(self._x / other.get_x(), self._y / other.get_y())
-        else:
-            return Vec2(self._x / other, self._y / other)
+        if type(other) is Vec2:
+            return Vec2(self._x / other._x, self._y / other._y)
+        return Vec2(self._x / other, self._y / other)
 
     def __matmul__(self, other):
-        return self._x * other.get_x() + self._y * other.get_y()
+        return self._x * other._x + self._y * other._y
 
     def rotate(self, angle):
         cosine = math.cos(angle)
@@ -54,22 +56,70 @@ class Vec2:
         return Vec2(cosine * self._x - sine * self._y, sine * self._x + cosine * self._y)
 
     def dot(self, other):
-        return self @ other
+        return self._x * other._x + self._y * other._y
 
-    def length(self):
+    def length(self):  # ** 2 rather than x * x, whose last bit can differ, keeps seeded runs reproducible
         return math.sqrt(self._x ** 2 + self._y ** 2)
 
+    def length_squared(self):  # for comparisons against a squared threshold, no sqrt needed
+        return self._x * self._x + self._y * self._y
+
     def normalize(self):
-        length = self.length()
+        length = math.sqrt(self._x ** 2 + self._y ** 2)
         return Vec2(self._x / length, self._y / length)
 
     def lerp(self, other, factor):  # linear interpolation
-        return Vec2(self._x * (1 - factor) + other.get_x() * factor, self._y * (1 - factor) + other.get_y() * factor)
+        return Vec2(self._x * (1 - factor) + other._x * factor, self._y * (1 - factor) + other._y * factor)
 
     def __str__(self):
         return f'Vec2({self._x}, {self._y})'
 
+    def __repr__(self):
+        return str(self)
+
     def __eq__(self, other):
-        if type(other) != Vec2:
+        if type(other) is not Vec2:
             return False
-        return self._x == other.get_x() and self._y == other.get_y()
+        return self._x == other._x and self._y == other._y
+
+    def __hash__(self):
+        return hash((self._x, self._y))
+
+
+def distance_sq(a, b):  # squared distance without the temporary of (a - b)
+    dx = a._x - b._x
+    dy = a._y - b._y
+    return dx * dx + dy * dy
+
+
+# Optional per-operation counters for profiling. The counting wrappers are only installed
+# while counting is enabled, so they cost nothing otherwise
+VEC2_COUNTED_OPS = {'__init__': 'allocations', 'length': 'length', 'normalize': 'normalize'}
+
+_op_counts = dict.fromkeys(VEC2_COUNTED_OPS.values(), 0)
+_original_ops = dict()
+
+
+def _counting(method, name):
+    def wrapper(*args, **kwargs):
+        _op_counts[name] += 1
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def set_op_counting(enabled):
+    if enabled and not _original_ops:
+        for attr, name in VEC2_COUNTED_OPS.items():
+            _original_ops[attr] = getattr(Vec2, attr)
+            setattr(Vec2, attr, _counting(_original_ops[attr], name))
+    elif not enabled and _original_ops:
+        for attr, method in _original_ops.items():
+            setattr(Vec2, attr, method)
+        _original_ops.clear()
+
+
+def take_op_counts():  # counts since the previous call
+    counts = dict(_op_counts)
+    for name in _op_counts:
+        _op_counts[name] = 0
+    return counts
@@ -0,0 +1,577 @@
+import numpy as np
+from math import pi, sqrt
+from time import perf_counter_ns
+
+from checkpoint import read_checkpoint, write_checkpoint
+from profiling import Profiler
+from simulation import (
+    SimulationConfig, TimeLine, get_contact_reach_sq, get_species, print_stats, AGENT_DEAD_STATE,
+    AGENT_FIND_FOOD_STATE, AGENT_FIND_PARTNER_STATE, AGENT_NORMAL_STATE, AGENT_SCARY_STATE,
+    SIMULATION_CONTACT_DISTANCE, SIMULATION_DEFAULT_CONFIG, SIMULATION_EVENTS, SIMULATION_MAX_STEPS_PER_LOOP,
+    SIMULATION_PROFILED_PHASES, SIMULATION_TIME_FACTOR, VICTIM_FOOD_REGROWN_SHARE,
+)
+
+
+class AgentArrays:
+
+    def __init__(self, fields, capacity=1024):
+        self._fields = fields  # name -> (dtype, shape of one item)
+        self._capacity = capacity
+        self._count = 0
+        self._data = {name: np.zeros((capacity, *shape), dtype) for name, (dtype, shape) in fields.items()}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, name):
+        return self._data[name][:self._count]
+
+    def __setitem__(self, name, values):
+        self._data[name][:self._count] = values
+
+    def _reserve(self, capacity):
+        if capacity <= self._capacity:
+            return
+        while self._capacity < capacity:
+            self._capacity *= 2
+        for name, (dtype, shape) in self._fields.items():
+            data = np.zeros((self._capacity, *shape), dtype)
+            data[:self._count] = self._data[name][:self._count]
+            self._data[name] = data
+
+    def append(self, number, **values):  # fields not given are zeroed
+        self._reserve(self._count + number)
+        begin, end = self._count, self._count + number
+        for name, data in self._data.items():
+            data[begin:end] = values.get(name, 0)
+        self._count = end
+
+    def compact(self, keep):
+        kept = int(np.count_nonzero(keep))
+        for data in self._data.values():
+            data[:kept] = data[:self._count][keep]
+        self._count = kept
+
+
+class GridIndex:
+
+    def __init__(self, positions, cell_size, world_size):
+        self._positions = positions
+        self._cell_size = cell_size
+        self._nx = int(world_size[0] // cell_size) + 1
+        self._ny = int(world_size[1] // cell_size) + 1
+        cells = self._cells_of(positions)
+        cell_ids = cells[:, 0] * self._ny + cells[:, 1]
+        self._order = np.argsort(cell_ids, kind='stable')
+        sorted_ids = cell_ids[self._order]
+        all_ids = np.arange(self._nx * self._ny)
+        self._starts = np.searchsorted(sorted_ids, all_ids, 'left')
+        self._ends = np.searchsorted(sorted_ids, all_ids, 'right')
+
+    def _cells_of(self, points):
+        cells = np.floor(points / self._cell_size).astype(np.int64)
+        np.clip(cells[:, 0], 0, self._nx - 1, out=cells[:, 0])
+        np.clip(cells[:, 1], 0, self._ny - 1, out=cells[:, 1])
+        return cells
+
+    # All (query, candidate) pairs closer than radius, radius must not exceed the cell size.
+    # Returns query indices, candidate indices and candidate - query vectors
+    def pairs(self, points, radius):
+        query_cells = self._cells_of(points)
+        queries, candidates = list(), list()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cx = query_cells[:, 0] + dx
+                cy = query_cells[:, 1] + dy
+                q = np.nonzero((cx >= 0) & (cx < self._nx) & (cy >= 0) & (cy < self._ny))[0]
+                cell_ids = cx[q] * self._ny + cy[q]
+                starts = self._starts[cell_ids]
+                counts = self._ends[cell_ids] - starts
+                offsets = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+                queries.append(np.repeat(q, counts))
+                candidates.append(self._order[offsets])
+        q = np.concatenate(queries)
+        c = np.concatenate(candidates)
+        d = self._positions[c] - points[q]
+        near = (d * d).sum(axis=1) <= radius * radius
+        return q[near], c[near], d[near]
+
+
+def nearest(number, queries, candidates, keys):  # candidate with the smallest key per query, -1 if none
+    result = np.full(number, -1, dtype=np.int64)
+    if len(queries):
+        order = np.lexsort((keys, queries))
+        q = queries[order]
+        first = np.ones(len(q), dtype=bool)
+        first[1:] = q[1:] != q[:-1]
+        result[q[first]] = candidates[order][first]
+    return result
+
+
+# Nearest of positions within radius of each point, -1 if none. Only valid positions count, point i
+# never picks position exclude[i] (itself), and preferred positions come before any closer other one
+def nearest_within(points, positions, radius, world_size, valid=None, exclude=None, preferred=None, index=None):
+    if len(points) == 0 or len(positions) == 0:
+        return np.full(len(points), -1, dtype=np.int64)
+    if index is None:
+        index = GridIndex(positions, radius, world_size)
+    q, c, d = index.pairs(points, radius)
+    keep = np.ones(len(q), dtype=bool)
+    if valid is not None:
+        keep &= valid[c]
+    if exclude is not None:
+        keep &= exclude[q] != c
+    q, c, d = q[keep], c[keep], d[keep]
+    keys = (d ** 2).sum(axis=1)
+    if preferred is not None:
+        keys *= ~preferred[c]
+    return nearest(len(points), q, c, keys)
+
+
+# Whether any position is within radius of each point, and the sum of unit vectors pointing away from them
+def flee_directions(points, positions, radius, world_size):
+    close = np.zeros(len(points), dtype=bool)
+    flee = np.zeros((len(points), 2))
+    if len(points) == 0 or len(positions) == 0:
+        return close, flee
+    q, c, d = GridIndex(positions, radius, world_size).pairs(points, radius)
+    length = np.linalg.norm(d, axis=1)
+    close[q] = True
+    q, away = q[length > 0], -d[length > 0] / length[length > 0, None]
+    flee[:, 0] = np.bincount(q, away[:, 0], len(points))
+    flee[:, 1] = np.bincount(q, away[:, 1], len(points))
+    return close, flee
+
+
+def mutual_pairs(partners):  # (i, j) with i < j that picked each other
+    i = np.nonzero(partners >= 0)[0]
+    j = partners[i]
+    mutual = (partners[j] == i) & (i < j)
+    return i[mutual], j[mutual]
+
+
+AGENT_FIELDS = {
+    'position': (np.float64, (2,)),
+    'go_point': (np.float64, (2,)),
+    'has_go_point': (np.bool_, ()),
+    'go_angle': (np.float64, ()),
+    'hunger': (np.float64, ()),
+    'baby_time': (np.float64, ()),
+    'eating': (np.bool_, ()),
+    'state': (np.int8, ()),
+}
+
+HP_FIELDS = {  # for species that can be hurt to death
+    'hp': (np.float64, ()),
+}
+
+BODY_FIELDS = {  # for species whose dead stay as bodies until they rot
+    'rotten_hp': (np.float64, ()),
+    'rot_deadline': (np.float64, ()),  # simulation time a dead body rots at
+}
+
+
+def agent_fields(species):  # name -> (dtype, shape of one item) for the arrays of a species
+    fields = dict(AGENT_FIELDS)
+    if species.init_hp != float('inf'):
+        fields.update(HP_FIELDS)
+    if species.rot_period is not None:
+        fields.update(BODY_FIELDS)
+    return fields
+
+
+# Same model as simulation.Simulation, but every agent of a species is updated at once from
+# the state at the start of its phase, so runs are not bit-identical to the object backend.
+# Agents choosing each other as partners mate only when the choice is mutual. As there, every
+# species runs the same kernel, _process_species, on arrays of its own
+class VectorSimulation:
+
+    def __init__(self, seed=None, fixed_sim_dt=None, config=SIMULATION_DEFAULT_CONFIG):
+        self._rng = np.random.default_rng(seed)
+        self._config = config
+        self._species = get_species(config)
+        self._world_size = np.array(config.world_size, dtype=np.float64)
+        self._agents = {name: AgentArrays(agent_fields(species)) for name, species in self._species.items()}
+        self._died = dict.fromkeys(self._species, 0)  # for species that leave bodies, when the body has rotten
+        self._victim_foods = np.zeros((0, 2))
+        self._victim_food_mass = np.zeros(0)
+        self._victim_food_available = np.zeros(0, dtype=bool)
+        self._available_foods = np.zeros(0, dtype=np.int64)  # indices of the patches in the index
+        self._victim_foods_index = None
+        self._foragers = {'victim_food': self._forage_victim_food, 'prey': self._hunt}  # diet -> how food is found and eaten
+        self._time_line = TimeLine(SIMULATION_TIME_FACTOR, fixed_sim_dt)
+        self._events = dict.fromkeys(SIMULATION_EVENTS, 0)
+        self._step_listeners = list()
+        self._profiler = Profiler()
+        self._phase_ns = None
+
+    def add_agents(self, name, positions, init_hunger=0.0):  # of the species called name
+        species = self._species[name]
+        self._agents[name].append(len(positions), position=positions, hunger=init_hunger, hp=species.init_hp,
+                                  rotten_hp=species.init_hp * 2, state=AGENT_NORMAL_STATE)
+
+    def add_victims(self, positions, init_hunger=0.0):
+        self.add_agents('victim', positions, init_hunger)
+
+    def add_predators(self, positions, init_hunger=0.0):
+        self.add_agents('predator', positions, init_hunger)
+
+    def add_victim_foods(self, positions, mass=None, available=None):
+        if mass is None:
+            mass = np.full(len(positions), float(self._config.victim_food_capacity))
+        if available is None:
+            available = np.ones(len(positions), dtype=bool)
+        self._victim_foods = np.concatenate((self._victim_foods, positions))
+        self._victim_food_mass = np.concatenate((self._victim_food_mass, mass))
+        self._victim_food_available = np.concatenate((self._victim_food_available, available))
+        self._index_victim_foods()
+
+    def _index_victim_foods(self):  # only needed when patches are added, emptied or have regrown
+        self._available_foods = np.nonzero(self._victim_food_available)[0]
+        self._victim_foods_index = GridIndex(self._victim_foods[self._available_foods],
+                                             self._config.victim_view_radius, self._world_size)
+
+    def _regrow_victim_foods(self, sim_dt):
+        capacity = self._config.victim_food_capacity
+        amount = self._config.victim_food_regrowth_speed * sim_dt
+        if capacity == 0 or amount == 0:
+            return
+        mass = self._victim_food_mass
+        np.minimum(mass + amount, capacity, out=mass)
+        regrown = ~self._victim_food_available & (mass >= capacity * VICTIM_FOOD_REGROWN_SHARE)
+        if regrown.any():
+            self._victim_food_available[regrown] = True
+            self._events['food_regrowths'] += int(np.count_nonzero(regrown))
+            self._index_victim_foods()
+
+    def _random_positions(self, number):
+        return self._rng.integers(0, self._world_size + 1, size=(number, 2)).astype(np.float64)
+
+    def setup(self):
+        for name, species in self._species.items():
+            self.add_agents(name, self._random_positions(species.init_number),
+                            self._rng.uniform(0, 400, species.init_number))
+        self.add_victim_foods(self._random_positions(self._config.victim_foods_init_number))
+
+    def _world_bounds(self, positions):  # lowest and highest point agents at positions may go to
+        return 0, self._world_size
+
+    def _set_go_points(self, agents, idx, points):
+        clamped = np.clip(points, *self._world_bounds(agents['position'][idx]))
+        changed = (clamped != points).any(axis=1)
+        agents['go_angle'][idx[changed]] = self._rng.uniform(0, 2 * pi, np.count_nonzero(changed))
+        agents['go_point'][idx] = clamped
+        agents['has_go_point'][idx] = True
+
+    def _wander(self, agents, species, idx):
+        has_go_point = agents['has_go_point'][idx]
+        angle = np.where(has_go_point,
+                         self._rng.normal(agents['go_angle'][idx], pi / 4) % (2 * pi),
+                         self._rng.uniform(0, 2 * pi, len(idx)))
+        agents['go_angle'][idx] = angle
+        offset = np.stack((np.cos(angle), np.sin(angle)), axis=1) * species.wander_distance
+        self._set_go_points(agents, idx, agents['position'][idx] + offset)
+
+    def _wander_if_arrived(self, agents, species, idx, sim_dt):
+        dist = np.linalg.norm(agents['go_point'][idx] - agents['position'][idx], axis=1)
+        arrived = ~agents['has_go_point'][idx] | (dist <= species.speed * sim_dt)
+        self._wander(agents, species, idx[arrived])
+
+    # Which of idx are within reach of their food or partner, see get_contact_reach_sq. Those reached
+    # from further than the contact distance, only with fast_forward_contact, close in to it
+    def _reach(self, agents, species, idx, sim_dt):
+        gap = agents['go_point'][idx] - agents['position'][idx]
+        dist = np.linalg.norm(gap, axis=1)
+        reached = dist <= sqrt(get_contact_reach_sq(species, sim_dt))
+        closing = reached & (dist > SIMULATION_CONTACT_DISTANCE)
+        agents['position'][idx[closing]] += gap[closing] * (1 - SIMULATION_CONTACT_DISTANCE / dist[closing])[:, None]
+        return reached
+
+    def _move(self, agents, sim_dt, normal_speed, speed):
+        dist_vec = agents['go_point'] - agents['position']
+        dist = np.linalg.norm(dist_vec, axis=1)
+        moving = agents['has_go_point'] & (dist > normal_speed * sim_dt)
+        step = speed[moving] * sim_dt / dist[moving]
+        agents['position'][moving] += dist_vec[moving] * step[:, None]
+
+    def _find_partners(self, agents, species, seeking):
+        if len(seeking) == 0:
+            return np.zeros(0, dtype=np.int64)
+        positions = agents['position']
+        can_make_baby = agents['baby_time'] >= species.baby_period
+        can_make_baby &= ~agents['eating'] & (agents['state'] == AGENT_FIND_PARTNER_STATE)
+        return nearest_within(positions[seeking], positions, species.view_radius, self._world_size,
+                              valid=can_make_baby, exclude=seeking)
+
+    def _seek_partners(self, agents, species, seeking, sim_dt):
+        partners = self._find_partners(agents, species, seeking)
+        found = partners >= 0
+        self._wander_if_arrived(agents, species, seeking[~found], sim_dt)
+        seeking, partners = seeking[found], partners[found]
+        positions = agents['position']
+        self._set_go_points(agents, seeking, positions[partners])
+        close = self._reach(agents, species, seeking, sim_dt)
+        chosen = np.full(len(agents), -1, dtype=np.int64)
+        chosen[seeking[close]] = partners[close]
+        i, j = mutual_pairs(chosen)
+        agents['baby_time'][i] = 0
+        agents['baby_time'][j] = 0
+        return (positions[i] + positions[j]) / 2
+
+    # Hunger and timers, then the state of every agent, like Agent.update_state: the dead of a
+    # species that leaves bodies stay as bodies until these rot or are eaten, the dead of the
+    # others and rotten bodies leave the arrays. Returns the flee directions of those that stayed
+    def _update_states(self, agents, species, sim_dt, t):
+        name = species.name
+        agents['baby_time'] += sim_dt
+        agents['hunger'] += species.hunger_growth_speed * sim_dt
+        t = self._lap('state_update', t)
+
+        close = flee = None
+        if species.flees is not None:
+            close, flee = flee_directions(agents['position'], self._agents[species.flees]['position'],
+                                          species.scary_radius, self._world_size)
+            t = self._lap('predator_scan', t)
+
+        hunger, state = agents['hunger'], agents['state']
+        was_dead = state == AGENT_DEAD_STATE
+        dead = hunger >= species.hunger_die_threshold
+        if species.init_hp != float('inf'):
+            dead |= agents['hp'] <= 0
+        if species.rot_period is None:
+            gone = dead
+        else:
+            gone = (agents['rotten_hp'] <= 0) | was_dead & (agents['rot_deadline'] <= self._time_line.get_time())
+            dead &= ~gone
+        died = dead & ~was_dead
+        self._events[f'{name}_deaths'] += int(np.count_nonzero(died))
+        if species.rot_period is not None:
+            agents['rot_deadline'][died] = self._time_line.get_time() + species.rot_period
+        rest = ~gone & ~dead
+        if close is not None:
+            scary = rest & close
+            rest &= ~close
+            state[scary] = AGENT_SCARY_STATE
+        find_food = rest & (hunger >= species.hunger_want_eat_threshold)
+        rest &= ~find_food
+        find_partner = rest & (hunger < species.hunger_want_partner_threshold)
+        find_partner &= (agents['baby_time'] >= species.baby_period) & ~agents['eating']
+        normal = rest & ~find_partner & ~agents['eating']
+        state[dead] = AGENT_DEAD_STATE
+        state[find_food] = AGENT_FIND_FOOD_STATE
+        state[find_partner] = AGENT_FIND_PARTNER_STATE
+        state[normal] = AGENT_NORMAL_STATE
+
+        if gone.any():
+            self._died[name] += int(np.count_nonzero(gone))
+            if flee is not None:
+                flee = flee[~gone]
+            agents.compact(~gone)
+        self._lap('state_update', t)
+        return flee
+
+    def _process_species(self, species, sim_dt):
+        agents = self._agents[species.name]
+        if len(agents) == 0:
+            return
+        flee = self._update_states(agents, species, sim_dt, perf_counter_ns())
+        t = perf_counter_ns()
+
+        state, positions = agents['state'], agents['position']
+        if flee is not None:
+            scary = np.nonzero(state == AGENT_SCARY_STATE)[0]
+            flee_length = np.linalg.norm(flee[scary], axis=1)
+            self._wander(agents, species, scary[flee_length == 0])
+            fleeing, flee_length = scary[flee_length != 0], flee_length[flee_length != 0]
+            self._set_go_points(agents, fleeing,
+                                flee[fleeing] / flee_length[:, None] * species.view_radius + positions[fleeing])
+
+        self._wander_if_arrived(agents, species, np.nonzero(state == AGENT_NORMAL_STATE)[0], sim_dt)
+        t = self._lap('movement', t)
+
+        babies = self._seek_partners(agents, species, np.nonzero(state == AGENT_FIND_PARTNER_STATE)[0], sim_dt)
+        t = self._lap('partner_search', t)
+
+        self._foragers[species.diet](agents, species, np.nonzero(state == AGENT_FIND_FOOD_STATE)[0], sim_dt)
+        t = self._lap('food_search', t)
+
+        if species.slowdown_hunger is None:
+            speed = np.full(len(agents), species.speed)
+        else:
+            speed = species.speed / np.maximum(1, (agents['hunger'] - species.hunger_want_eat_threshold) / species.slowdown_hunger)
+        self._move(agents, sim_dt, species.speed, speed)
+        self.add_agents(species.name, babies)
+        self._events[f'{species.name}_births'] += len(babies)
+        self._lap('movement', t)
+
+    def _forage_victim_food(self, agents, species, hungry, sim_dt):
+        positions, available = agents['position'], self._available_foods
+        found_in = nearest_within(positions[hungry], self._victim_foods[available], species.view_radius,
+                                  self._world_size, index=self._victim_foods_index)
+        found = found_in >= 0
+        foods = np.full(len(hungry), -1, dtype=np.int64)
+        foods[found] = available[found_in[found]]
+        self._wander_if_arrived(agents, species, hungry[~found], sim_dt)
+        hungry, foods = hungry[found], foods[found]
+        self._set_go_points(agents, hungry, self._victim_foods[foods])
+        close = self._reach(agents, species, hungry, sim_dt)
+        self._feed_on_victim_foods(agents, species, hungry[close], foods[close], sim_dt)
+
+    def _feed_on_victim_foods(self, agents, species, eating, foods, sim_dt):
+        self._eat(agents, eating, species.eat_speed * sim_dt)
+        self._events[f'{species.name}_eats'] += len(eating)
+        if self._config.victim_food_capacity == 0 or len(foods) == 0:
+            return
+        mass = self._victim_food_mass
+        np.subtract.at(mass, foods, species.bite_speed * sim_dt)
+        np.maximum(mass, 0, out=mass)
+        emptied = self._victim_food_available & (mass == 0)
+        if emptied.any():
+            self._victim_food_available[emptied] = False
+            self._events['food_depletions'] += int(np.count_nonzero(emptied))
+            self._index_victim_foods()
+
+    def _hunt(self, agents, species, hungry, sim_dt):  # the 'prey' diet, bodies of the prey are eaten too
+        positions, prey = agents['position'], self._agents[species.prey]
+        bodies = prey['state'] == AGENT_DEAD_STATE
+        # dead bodies are preferred over live prey, as in the object model
+        foods = nearest_within(positions[hungry], prey['position'], species.view_radius, self._world_size,
+                               preferred=bodies)
+        found = foods >= 0
+        self._wander_if_arrived(agents, species, hungry[~found], sim_dt)
+        hungry, foods = hungry[found], foods[found]
+        self._set_go_points(agents, hungry, prey['position'][foods])
+        close = self._reach(agents, species, hungry, sim_dt)
+        hungry, foods = hungry[close], foods[close]
+        self._eat(agents, hungry, species.eat_speed * sim_dt)
+        self._events[f'{species.name}_eats'] += len(hungry)
+        dead_body = bodies[foods]
+        np.subtract.at(prey['hp'], foods[~dead_body], species.bite_speed * sim_dt)
+        np.subtract.at(prey['rotten_hp'], foods[dead_body], species.bite_speed * sim_dt)
+
+    def _lap(self, phase, start):  # adds the time since start to phase when profiling, returns the new start
+        if self._phase_ns is None:
+            return start
+        now = perf_counter_ns()
+        self._phase_ns[phase] += now - start
+        return now
+
+    def _eat(self, agents, idx, amount):
+        agents['eating'][idx] = True
+        agents['hunger'][idx] -= amount
+        full = idx[agents['hunger'][idx] <= 0]
+        agents['hunger'][full] = 0
+        agents['eating'][full] = False
+
+    def get_time(self):
+        return self._time_line.get_time()
+
+    def get_config(self):
+        return self._config
+
+    def get_victims_number(self):
+        return len(self._agents['victim'])
+
+    def get_predators_number(self):
+        return len(self._agents['predator'])
+
+    def get_victim_foods_available(self):
+        return len(self._available_foods)
+
+    def get_victim_food_mass(self):
+        return float(self._victim_food_mass.sum())
+
+    def get_victims_died(self):
+        return self._died['victim']
+
+    def get_predators_died(self):
+        return self._died['predator']
+
+    def get_state_counts(self, name):  # agents of the species called name by state
+        names = self._species[name].agent_class.STATE_NAMES
+        return np.bincount(self._agents[name]['state'], minlength=len(names)).tolist()
+
+    def get_victim_state_counts(self):
+        return self.get_state_counts('victim')
+
+    def get_predator_state_counts(self):
+        return self.get_state_counts('predator')
+
+    def get_event_counts(self):
+        return dict(self._events)
+
+    def get_profiler(self):
+        return self._profiler
+
+    def add_step_listener(self, listener):
+        self._step_listeners.append(listener)
+
+    def remove_step_listener(self, listener):
+        self._step_listeners.remove(listener)
+
+    def print_stats(self):
+        print_stats(self)
+
+    def save(self, path):
+        meta = {
+            'time_line': self._time_line.get_checkpoint(),
+            'events': self._events,
+            'config': self._config.to_dict(),
+            'random_state': self._rng.bit_generator.state,
+        }
+        columns = {'victim_food.position': self._victim_foods, 'victim_food.mass': self._victim_food_mass,
+                   'victim_food.available': self._victim_food_available}
+        for name, species in self._species.items():
+            meta[f'{species.kind}_died'] = self._died[name]
+            agents = self._agents[name]
+            columns.update({f'{name}.{field}': agents[field] for field in agent_fields(species)})
+        write_checkpoint(path, 'numpy', meta, columns)
+
+    @classmethod
+    def load(cls, path):
+        meta, columns = read_checkpoint(path, 'numpy')
+        simulation = cls(config=SimulationConfig.from_dict(meta['config']))
+        simulation._rng.bit_generator.state = meta['random_state']
+        simulation._time_line.restore_checkpoint(meta['time_line'])
+        simulation._events.update(meta['events'])
+        for name, species in simulation._species.items():
+            simulation._died[name] = meta[f'{species.kind}_died']
+            simulation._agents[name].append(len(columns[f'{name}.state']),
+                                            **{field: columns[f'{name}.{field}'] for field in agent_fields(species)})
+        simulation.add_victim_foods(columns['victim_food.position'], columns['victim_food.mass'],
+                                    columns['victim_food.available'])
+        return simulation
+
+    def _tick(self, sim_dt):
+        profiling = self._profiler.is_enabled()
+        if profiling:
+            self._phase_ns = dict.fromkeys(SIMULATION_PROFILED_PHASES, 0)
+            start = perf_counter_ns()
+        for species in self._species.values():
+            self._process_species(species, sim_dt)
+        self._regrow_victim_foods(sim_dt)
+        if profiling:
+            self._phase_ns['tick'] = perf_counter_ns() - start
+            for phase, ns in self._phase_ns.items():
+                self._profiler.record(phase, ns)
+            self._profiler.end_tick()
+            self._phase_ns = None
+        for listener in self._step_listeners:
+            listener(self)
+
+    def step(self, sim_dt):
+        self._time_line.advance(sim_dt)
+        self._tick(sim_dt)
+
+    def loop(self, dt):
+        if self._time_line.get_fixed_step() is not None:
+            self._time_line.accumulate(dt, SIMULATION_MAX_STEPS_PER_LOOP)
+            while self._time_line.take_fixed_step():
+                self.step(self._time_line.get_fixed_step())
+            return
+
+        self._time_line.update(dt)
+        self._tick(self._time_line.get_delta_time())
+
+    def clear(self):
+        pass
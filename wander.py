@@ -0,0 +1,68 @@
+import random
+from math import cos, pi, sin
+
+
+WANDER_BLOCK_SIZE = 4096  # directions generated per refill
+WANDER_TURN_DEVIATION = pi / 4  # standard deviation of the turn between two consecutive wander targets
+
+_HEADINGS = 0  # uniform angles in [0, 2 pi)
+_TURNS = 1  # normal turns around the current heading
+
+
+# Wander directions for one simulation, as (angle, cosine, sine) triples, so agents neither draw
+# from the RNG nor call cos and sin per target. Each of the two streams is refilled a block at a
+# time, and block n is generated from (key, stream, n) alone, so the block number and the index
+# into it are all the state a checkpoint needs. The seed is anything random.Random accepts. Blocks
+# come from random.Random whether or not numpy is installed, so a seed gives the same trajectories
+# everywhere
+class WanderStream:
+
+    def __init__(self, seed=None):
+        self._key = random.Random(seed).getrandbits(63)
+        # per stream: number of the current block, its values and the next index into them
+        self._heading_block, self._headings, self._heading_cursor = -1, None, WANDER_BLOCK_SIZE
+        self._turn_block, self._turns, self._turn_cursor = -1, None, WANDER_BLOCK_SIZE
+
+    def _fill(self, stream, block):
+        if block < 0:
+            return None
+        generator = random.Random(f'{self._key}/{stream}/{block}')
+        if stream == _HEADINGS:
+            uniform = generator.random
+            angles = [2 * pi * uniform() for i in range(WANDER_BLOCK_SIZE)]
+        else:
+            gauss = generator.gauss
+            angles = [gauss(0, WANDER_TURN_DEVIATION) for i in range(WANDER_BLOCK_SIZE)]
+        return [(angle, cos(angle), sin(angle)) for angle in angles]
+
+    def next_heading(self):  # a direction picked uniformly at random
+        cursor = self._heading_cursor
+        if cursor == WANDER_BLOCK_SIZE:
+            self._heading_block += 1
+            self._headings = self._fill(_HEADINGS, self._heading_block)
+            cursor = 0
+        self._heading_cursor = cursor + 1
+        return self._headings[cursor]
+
+    def next_turn(self):  # a change of direction, to be added to the current heading
+        cursor = self._turn_cursor
+        if cursor == WANDER_BLOCK_SIZE:
+            self._turn_block += 1
+            self._turns = self._fill(_TURNS, self._turn_block)
+            cursor = 0
+        self._turn_cursor = cursor + 1
+        return self._turns[cursor]
+
+    def get_state(self):
+        return {'key': self._key, 'blocks': [self._heading_block, self._turn_block],
+                'cursors': [self._heading_cursor, self._turn_cursor]}
+
+    def set_state(self, state):
+        self._key = state['key']
+        self._heading_block, self._turn_block = state['blocks']
+        self._heading_cursor, self._turn_cursor = state['cursors']
+        self._headings = self._fill(_HEADINGS, self._heading_block)
+        self._turns = self._fill(_TURNS, self._turn_block)
+
+
+WANDER_DEFAULT_STREAM = WanderStream()  # for agents created outside a simulation